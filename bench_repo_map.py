@@ -0,0 +1,65 @@
+# bench_repo_map.py (project root) — iterations-to-first-edit with and without --repo-map
+#
+# Runs the same editing prompt several times with the repository map on and
+# off, each run in a fresh temporary copy of the working directory, and
+# reports how many agent iterations passed before the first successful
+# write_file.
+#
+# Usage:
+#   uv run bench_repo_map.py [runs] ["prompt"]
+import os
+import shutil
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+from google import genai
+
+from functions.metrics import Metrics
+from functions.repo_map import cache_path
+from main import run_agent
+
+WORKING_DIRECTORY = "calculator"
+DEFAULT_PROMPT = "Add a modulo operator (%) to the calculator with the same precedence as * and /."
+
+
+def run_once(client, prompt, repo_map):
+    """Return iterations to first edit for one session (None if it never edited)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = os.path.join(tmp, os.path.basename(WORKING_DIRECTORY))
+        shutil.copytree(WORKING_DIRECTORY, workspace, ignore=shutil.ignore_patterns("__pycache__"))
+        metrics = Metrics()
+        options = {"repo_map": repo_map, "no_snapshots": True}
+        try:
+            run_agent(client, prompt, working_directory=workspace, options=options,
+                      metrics=metrics, emit=lambda line="": None)
+        finally:
+            # The cache is keyed by the temp path, so it would never be reused
+            if os.path.exists(cache_path(workspace)):
+                os.remove(cache_path(workspace))
+        values = metrics.snapshot()["timings"].get(f"repo_map.{'on' if repo_map else 'off'}.iterations_to_first_edit")
+        return values[0] if values else None
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    prompt = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_PROMPT
+
+    load_dotenv()
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        print("Error: GEMINI_API_KEY not found in environment (.env).")
+        sys.exit(1)
+    client = genai.Client(api_key=api_key)
+
+    for repo_map in (False, True):
+        results = [run_once(client, prompt, repo_map) for _ in range(runs)]
+        edited = [r for r in results if r is not None]
+        mean = sum(edited) / len(edited) if edited else float("nan")
+        label = "on " if repo_map else "off"
+        print(f"repo map {label}: iterations to first edit {results} mean={mean:.1f} "
+              f"({len(edited)}/{runs} sessions edited)")
+
+
+if __name__ == "__main__":
+    main()
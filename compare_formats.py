@@ -0,0 +1,68 @@
+# compare_formats.py (project root) — token cost of text vs --compact tool results
+#
+# Runs a few representative tool calls against the working directory in both
+# formats and counts the tokens each function_response adds to the prompt.
+# Uses the Gemini count_tokens API when GEMINI_API_KEY is set, otherwise a
+# rough 4-characters-per-token estimate.
+#
+# Usage:
+#   uv run compare_formats.py [working_directory]
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+from google import genai
+
+from functions.get_files_info import get_files_info
+from functions.run_python import run_python_file
+
+MODEL = "gemini-2.0-flash-001"
+
+CASES = [
+    ("get_files_info .", lambda wd, compact: get_files_info(wd, ".", compact=compact)),
+    ("get_files_info pkg", lambda wd, compact: get_files_info(wd, "pkg", compact=compact)),
+    ("run_python_file main.py '3 + 5'", lambda wd, compact: run_python_file(wd, "main.py", ["3 + 5"], compact=compact)),
+    ("run_python_file tests.py", lambda wd, compact: run_python_file(wd, "tests.py", compact=compact)),
+]
+
+
+def make_counter():
+    """Return (count_fn, label): exact counts from the API if possible, else an estimate."""
+    load_dotenv()
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if api_key:
+        client = genai.Client(api_key=api_key)
+
+        def count(text):
+            return client.models.count_tokens(model=MODEL, contents=text).total_tokens
+
+        return count, f"tokens ({MODEL})"
+    return (lambda text: max(1, round(len(text) / 4))), "tokens (estimated, chars/4)"
+
+
+def as_response(result):
+    """Serialize a tool result the way call_function wraps it."""
+    response = result if isinstance(result, dict) else {"result": result}
+    return json.dumps(response, ensure_ascii=False)
+
+
+def main():
+    working_directory = sys.argv[1] if len(sys.argv) > 1 else "calculator"
+    count, label = make_counter()
+
+    print(f"{'call':<34} {'text':>6} {'compact':>8} {'saved':>7}")
+    total_text = total_compact = 0
+    for title, call in CASES:
+        text = count(as_response(call(working_directory, False)))
+        compact = count(as_response(call(working_directory, True)))
+        total_text += text
+        total_compact += compact
+        print(f"{title:<34} {text:>6} {compact:>8} {1 - compact / text:>7.0%}")
+
+    print(f"{'total':<34} {total_text:>6} {total_compact:>8} {1 - total_compact / total_text:>7.0%}")
+    print(f"\nUnits: {label}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+# daemon.py (project root) — long-running agent server
+#
+# Keeps one genai.Client, a shared prefetch cache and hedging latency history
+# warm, and runs agent sessions (main.run_agent) on a bounded worker pool.
+# Each session gets its own working directory under WORKSPACE_ROOT; new ones
+# are copies of the template at <root>/<session id>/<template name>, so the
+# model's usual "calculator/..." paths are still stripped by main.py.
+#
+# Usage:
+#   uv run daemon.py [--port 8765] [--socket /tmp/agent.sock]
+#                    [--max-concurrent 4] [--max-queue 16]
+#                    [--session-ttl 3600] [--max-finished 100]
+#
+# Finished sessions are forgotten after SESSION_TTL seconds, or sooner once
+# more than MAX_FINISHED are kept; workspaces the daemon created for them
+# are deleted along with their snapshots and repo map cache.
+#
+# API (JSON unless noted):
+#   POST /sessions              {"prompt": "...", "working_directory"?: "...",
+#                                "options"?: {"prefetch": true, ...}, "verbose"?: false}
+#                               -> 202 {"id", "state", "working_directory"}
+#                                  429 if the queue is full, 409 if the workspace is in use
+#   GET  /sessions/<id>         -> session state, result and output so far
+#   GET  /sessions/<id>/stream  -> text/plain, output lines as they are produced
+#   POST /sessions/<id>/cancel  -> stops before the next model/tool call
+#   GET  /status                -> queue depth, running sessions and limits
+import json
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import TCPServer
+
+from dotenv import load_dotenv
+from google import genai
+
+from functions.metrics import Metrics
+from functions.prefetch import Prefetcher
+from functions.hedging import Hedger
+from functions.repo_map import cache_path
+from functions.snapshots import SnapshotStore
+from main import OPTION_FLAGS, run_agent
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_CONCURRENT = 4       # sessions running at once
+MAX_QUEUE = 16           # sessions waiting for a worker; more are rejected with 429
+WORKSPACE_ROOT = "workspaces"
+WORKSPACE_TEMPLATE = "calculator"  # copied into a new workspace when none is given
+SESSION_TTL = 3600       # seconds a finished session (and its output) is kept
+MAX_FINISHED = 100       # finished sessions kept at most; oldest are dropped first
+DELETE_WORKSPACES = True  # remove daemon-created workspaces when their session is dropped
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WorkspaceBusy(Exception):
+    pass
+
+
+class Session:
+    """One agent run: its output lines, state and cancel flag."""
+
+    def __init__(self, prompt, working_directory, options, verbose):
+        self.id = uuid.uuid4().hex[:12]
+        self.prompt = prompt
+        self.working_directory = working_directory
+        self.auto_workspace = False  # created from the template by the daemon
+        self.options = options
+        self.verbose = verbose
+        self.state = "queued"  # queued | running | done | cancelled | failed
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.lines = []
+        self.cancel = threading.Event()
+        self.metrics = Metrics()
+        self._cond = threading.Condition()
+
+    def emit(self, line=""):
+        with self._cond:
+            self.lines.extend(str(line).split("\n"))
+            self._cond.notify_all()
+
+    def set_state(self, state):
+        with self._cond:
+            self.state = state
+            if state == "running":
+                self.started = time.time()
+            elif state in ("done", "cancelled", "failed"):
+                self.finished = time.time()
+            self._cond.notify_all()
+
+    def is_finished(self):
+        return self.state in ("done", "cancelled", "failed")
+
+    def wait_lines(self, start, timeout=1.0):
+        """Return (new_lines, finished) once there is output past `start` or the session ends."""
+        with self._cond:
+            if len(self.lines) <= start and not self.is_finished():
+                self._cond.wait(timeout)
+            return self.lines[start:], self.is_finished()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "state": self.state,
+            "prompt": self.prompt,
+            "working_directory": self.working_directory,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "output": list(self.lines),
+            "metrics": self.metrics.snapshot()["counters"],
+        }
+
+
+class SessionManager:
+    """Admission control, worker pool and shared state for all sessions."""
+
+    def __init__(self, client, max_concurrent=MAX_CONCURRENT, max_queue=MAX_QUEUE,
+                 workspace_root=WORKSPACE_ROOT, template=WORKSPACE_TEMPLATE,
+                 session_ttl=SESSION_TTL, max_finished=MAX_FINISHED,
+                 delete_workspaces=DELETE_WORKSPACES):
+        self.client = client
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.session_ttl = session_ttl
+        self.max_finished = max_finished
+        self.delete_workspaces = delete_workspaces
+        self.workspace_root = os.path.realpath(workspace_root)
+        self.template = template
+        self.metrics = Metrics()
+        self.prefetcher = Prefetcher(metrics=self.metrics)  # shared across sessions
+        self.hedger = Hedger(metrics=self.metrics)  # latency history shared across sessions
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="session")
+        os.makedirs(self.workspace_root, exist_ok=True)
+
+    def _count(self, state):
+        return sum(1 for s in self.sessions.values() if s.state == state)
+
+    def _workspace(self, session_id, working_directory):
+        """
+        Resolve a requested workspace inside WORKSPACE_ROOT, or pick the path of a
+        new one. Returns (path, auto); an auto path is created by _create_workspace().
+        """
+        if working_directory is not None and not isinstance(working_directory, str):
+            raise ValueError("working_directory must be a string")
+        if working_directory:
+            target = os.path.realpath(os.path.join(self.workspace_root, working_directory))
+            if os.path.commonpath([self.workspace_root, target]) != self.workspace_root:
+                raise ValueError(f'"{working_directory}" is outside the workspace root')
+            if target == self.workspace_root:
+                raise ValueError("a session can't use the workspace root itself")
+            if not os.path.isdir(target):
+                raise ValueError(f'"{working_directory}" is not a directory')
+            # Two live sessions on one (or nested) directory would race on its files and snapshots
+            for other in self.sessions.values():
+                if other.is_finished() or not other.working_directory:
+                    continue
+                if os.path.commonpath([other.working_directory, target]) in (other.working_directory, target):
+                    raise WorkspaceBusy(f'"{working_directory}" is in use by session {other.id}')
+            return target, False
+        name = os.path.basename(os.path.normpath(self.template))
+        return os.path.join(self.workspace_root, session_id, name), True
+
+    def _create_workspace(self, session):
+        """Copy the template into a new session's workspace (slow, so not under the lock)."""
+        try:
+            shutil.copytree(self.template, session.working_directory,
+                            ignore=shutil.ignore_patterns("__pycache__"))
+        except OSError:
+            with self._lock:
+                del self.sessions[session.id]
+            shutil.rmtree(os.path.dirname(session.working_directory), ignore_errors=True)
+            raise
+
+    def submit(self, prompt, working_directory=None, options=None, verbose=False):
+        opts = {name: False for name in OPTION_FLAGS.values()}
+        for key, value in (options or {}).items():
+            if key not in opts:
+                raise ValueError(f"Unknown option: {key}")
+            opts[key] = bool(value)
+
+        with self._lock:
+            if self._count("queued") >= self.max_queue:
+                self.metrics.incr("daemon.rejected")
+                raise QueueFull(f"queue is full ({self.max_queue} sessions waiting)")
+            session = Session(prompt, None, opts, verbose)
+            session.working_directory, session.auto_workspace = self._workspace(session.id, working_directory)
+            # Registered (queued) before the copy, so its slot and workspace are already taken
+            self.sessions[session.id] = session
+        if session.auto_workspace:
+            self._create_workspace(session)
+        self.metrics.incr("daemon.submitted")
+        self.prune()
+        self._pool.submit(self._run, session)
+        return session
+
+    def _run(self, session):
+        if session.cancel.is_set():
+            session.set_state("cancelled")
+            return
+        session.set_state("running")
+        self.metrics.observe("daemon.queue_seconds", session.started - session.created)
+        try:
+            session.result = run_agent(
+                self.client,
+                session.prompt,
+                working_directory=session.working_directory,
+                options=session.options,
+                verbose=session.verbose,
+                metrics=session.metrics,
+                prefetcher=self.prefetcher if session.options["prefetch"] else None,
+                hedger=self.hedger if session.options["hedge"] else None,
+                emit=session.emit,
+                cancel=session.cancel,
+            )
+            session.set_state("cancelled" if session.cancel.is_set() else "done")
+        except Exception as e:
+            session.error = str(e)
+            session.emit(f"Error: {e}")
+            session.set_state("failed")
+        self.metrics.incr(f"daemon.{session.state}")
+        self.metrics.observe("daemon.run_seconds", session.finished - session.started)
+
+    def prune(self, now=None):
+        """
+        Forget finished sessions older than session_ttl, and the oldest beyond
+        max_finished. Returns the number dropped.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            finished = sorted(
+                (s for s in self.sessions.values() if s.is_finished()),
+                key=lambda s: s.finished,
+            )
+            excess = len(finished) - self.max_finished
+            dropped = [
+                s for i, s in enumerate(finished)
+                if i < excess or now - s.finished > self.session_ttl
+            ]
+            for session in dropped:
+                del self.sessions[session.id]
+
+        # Disk cleanup outside the lock; only workspaces the daemon created itself
+        for session in dropped:
+            if self.delete_workspaces and session.auto_workspace:
+                self._delete_workspace(session.working_directory)
+        if dropped:
+            self.metrics.incr("daemon.pruned", len(dropped))
+        return len(dropped)
+
+    def _delete_workspace(self, working_directory):
+        """Remove an auto-created workspace (and its session directory), snapshot store and repo map cache."""
+        snapshot_root = SnapshotStore(working_directory).root
+        shutil.rmtree(snapshot_root, ignore_errors=True)
+        try:
+            os.remove(cache_path(working_directory))
+        except OSError:
+            pass
+        shutil.rmtree(os.path.dirname(working_directory), ignore_errors=True)
+
+    def cancel(self, session_id):
+        session = self.sessions[session_id]
+        session.cancel.set()
+        if session.state == "queued":
+            session.set_state("cancelled")
+        return session
+
+    def status(self):
+        self.prune()
+        with self._lock:
+            return {
+                "queued": self._count("queued"),
+                "running": self._count("running"),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "session_ttl": self.session_ttl,
+                "max_finished": self.max_finished,
+                "sessions": len(self.sessions),
+                "metrics": self.metrics.snapshot()["counters"],
+            }
+
+
+class Handler(BaseHTTPRequestHandler):
+    manager = None  # set in serve()
+
+    def address_string(self):
+        # client_address is '' for Unix sockets
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _json(self, code, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _session(self, session_id):
+        session = self.manager.sessions.get(session_id)
+        if session is None:
+            self._json(404, {"error": f"Unknown session: {session_id}"})
+        return session
+
+    def do_GET(self):
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if parts == ["status"]:
+            return self._json(200, self.manager.status())
+        if len(parts) == 2 and parts[0] == "sessions":
+            session = self._session(parts[1])
+            if session:
+                self._json(200, session.to_dict())
+            return
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "stream":
+            session = self._session(parts[1])
+            if session:
+                self._stream(session)
+            return
+        self._json(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if parts == ["sessions"]:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                prompt = body.get("prompt")
+                if not isinstance(prompt, str) or not prompt.strip():
+                    raise ValueError("prompt is required")
+                session = self.manager.submit(
+                    prompt,
+                    working_directory=body.get("working_directory"),
+                    options=body.get("options"),
+                    verbose=bool(body.get("verbose")),
+                )
+            except QueueFull as e:
+                return self._json(429, {"error": str(e)})
+            except WorkspaceBusy as e:
+                return self._json(409, {"error": str(e)})
+            except (ValueError, AttributeError) as e:
+                return self._json(400, {"error": str(e)})
+            except OSError as e:
+                return self._json(500, {"error": f"could not create workspace: {e}"})
+            return self._json(202, {
+                "id": session.id,
+                "state": session.state,
+                "working_directory": session.working_directory,
+            })
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "cancel":
+            session = self._session(parts[1])
+            if session:
+                self.manager.cancel(session.id)
+                self._json(200, {"id": session.id, "state": session.state})
+            return
+        self._json(404, {"error": f"Not found: {self.path}"})
+
+    def _stream(self, session):
+        """Write output lines as they arrive; the response ends when the session does."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.end_headers()
+        sent = 0
+        try:
+            while True:
+                lines, finished = session.wait_lines(sent)
+                if lines:
+                    self.wfile.write(("\n".join(lines) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                    sent += len(lines)
+                if finished and not lines:
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind expects a (host, port) address
+        TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def parse_args():
+    """Returns a dict of daemon settings from the command-line flags (see the header comment)."""
+    settings = {
+        "port": PORT,
+        "socket": None,
+        "max_concurrent": MAX_CONCURRENT,
+        "max_queue": MAX_QUEUE,
+        "session_ttl": SESSION_TTL,
+        "max_finished": MAX_FINISHED,
+    }
+    raw = sys.argv[1:]
+    while raw:
+        flag = raw.pop(0)
+        key = flag.lstrip("-").replace("-", "_")
+        if key not in settings or not raw:
+            print("Usage: uv run daemon.py [--port N] [--socket PATH] [--max-concurrent N] [--max-queue N]\n"
+                  "                        [--session-ttl SECONDS] [--max-finished N]")
+            sys.exit(1)
+        value = raw.pop(0)
+        settings[key] = value if key == "socket" else int(value)
+    return settings
+
+
+def serve():
+    settings = parse_args()
+
+    load_dotenv()
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        print("Error: GEMINI_API_KEY not found in environment (.env).")
+        sys.exit(1)
+
+    # One client for every session (its HTTP connection pool stays warm)
+    client = genai.Client(api_key=api_key)
+    Handler.manager = SessionManager(
+        client,
+        max_concurrent=settings["max_concurrent"],
+        max_queue=settings["max_queue"],
+        session_ttl=settings["session_ttl"],
+        max_finished=settings["max_finished"],
+    )
+
+    if settings["socket"]:
+        if os.path.exists(settings["socket"]):
+            os.remove(settings["socket"])
+        server = UnixHTTPServer(settings["socket"], Handler)
+        print(f"Agent daemon listening on unix:{settings['socket']}")
+    else:
+        server = ThreadingHTTPServer((HOST, settings["port"]), Handler)
+        print(f"Agent daemon listening on http://{HOST}:{settings['port']}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve()
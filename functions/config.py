@@ -1,2 +1,57 @@
 # config for functions
 MAX_CHARS = 10000
+
+# speculative prefetch after get_files_info (see functions/prefetch.py)
+PREFETCH_MAX_FILES = 8            # files loaded per directory listing
+PREFETCH_MAX_FILE_BYTES = 16384   # skip anything bigger than this on disk
+PREFETCH_MAX_ENTRIES = 64         # total files kept in memory (oldest evicted first)
+PREFETCH_EXTENSIONS = (".py", ".txt", ".md", ".json", ".toml", ".cfg", ".ini")
+
+# workspace snapshots before mutating tool calls (see functions/snapshots.py)
+SNAPSHOT_DIR = ".agent_snapshots"
+SNAPSHOT_IGNORE = ("__pycache__", ".git", ".venv")
+
+# run_python_file limits, applied in the child before the script starts.
+# None disables a limit. RLIMIT_NPROC counts every process of the user, not
+# just the script's, so it is off by default.
+RUN_TIMEOUT = 30                  # wall-clock seconds; the whole process group is killed
+RUN_MAX_ADDRESS_SPACE_MB = 1024   # RLIMIT_AS
+RUN_MAX_CPU_SECONDS = 30          # RLIMIT_CPU
+RUN_MAX_OPEN_FILES = 256          # RLIMIT_NOFILE
+RUN_MAX_PROCESSES = None          # RLIMIT_NPROC
+
+# repeated tool-call detection (see functions/loop_guard.py)
+LOOP_GUARD_MAX_REPEATS = 3        # stop the session after this many repeats of one call
+
+# run_python_file(profile=True): rows in each hotspot table (see functions/profiling.py)
+PROFILE_TOP_N = 10
+
+# model routing (see functions/router.py); prices are USD per 1M tokens (input, output)
+MODEL_DEFAULT = "gemini-2.0-flash-001"
+MODEL_FAST = "gemini-2.0-flash-lite-001"
+MODEL_PRICES = {
+    "gemini-2.0-flash-001": (0.10, 0.40),
+    "gemini-2.0-flash-lite-001": (0.075, 0.30),
+}
+ROUTER_FAILURE_WINDOW = 3         # steps a malformed response keeps us on the default model
+ROUTING_RULES = [
+    # first match wins; anything unmatched goes to MODEL_DEFAULT
+    {"name": "escalate_after_failure", "when": {"failures_at_least": 1}, "model": MODEL_DEFAULT},
+    {"name": "first_step", "when": {"step_at_most": 1}, "model": MODEL_FAST},
+    {
+        "name": "after_read",
+        "when": {"previous_tools_within": ["get_files_info", "get_file_content"], "prompt_chars_at_most": 20000},
+        "model": MODEL_FAST,
+    },
+]
+
+# hedged model requests (see functions/hedging.py)
+HEDGE_PERCENTILE = 0.95           # hedge once a call is slower than this share of recent calls
+HEDGE_WINDOW = 50                 # recent latencies kept per model
+HEDGE_MIN_SAMPLES = 5             # until then, wait HEDGE_INITIAL_DELAY
+HEDGE_INITIAL_DELAY = 10.0        # seconds
+HEDGE_MAX_RATE = 0.1              # at most this share of calls may send a hedge
+
+# repository map prepended to the system prompt (see functions/repo_map.py)
+REPO_MAP_DIR = ".agent_cache"
+REPO_MAP_TOKEN_BUDGET = 1500      # approximate tokens (4 chars each) for the summary
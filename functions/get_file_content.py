@@ -21,6 +21,17 @@ schema_get_file_content = types.FunctionDeclaration(
 )
 
 
+def truncate_content(content, file_path):
+    """
+    Apply the MAX_CHARS limit to text read from `file_path`.
+    `content` should be read with at least MAX_CHARS + 1 characters so
+    truncation can be detected.
+    """
+    if len(content) > MAX_CHARS:
+        return content[:MAX_CHARS] + f'\n[...File "{file_path}" truncated at {MAX_CHARS} characters]'
+    return content
+
+
 def get_file_content(working_directory, file_path):
     """
     Safely read a file located inside working_directory.
@@ -57,12 +68,8 @@ def get_file_content(working_directory, file_path):
         with open(target, "r", encoding="utf-8", errors="replace") as f:
             content = f.read(MAX_CHARS + 1)
 
-        if len(content) > MAX_CHARS:
-            # Truncate and append the required message
-            truncated = content[:MAX_CHARS] + f'\n[...File "{file_path}" truncated at {MAX_CHARS} characters]'
-            return truncated
-
-        return content
+        # Truncate and append the required message if too long
+        return truncate_content(content, file_path)
 
     except Exception as e:
         return f"Error: {e}"
@@ -17,7 +17,7 @@ schema_get_files_info = types.FunctionDeclaration(
 )
 
 
-def get_files_info(working_directory, directory="."):
+def get_files_info(working_directory, directory=".", compact=False):
     """
     Return a string describing the contents of `directory` (relative to working_directory).
     If the resolved path is outside working_directory, or is not a directory,
@@ -25,6 +25,9 @@ def get_files_info(working_directory, directory="."):
 
     Output format (each entry on its own line):
     - name: file_size=NN bytes, is_dir=True|False
+
+    With compact=True, return columnar data instead:
+    {"name": [...], "size": [...], "is_dir": [...]}
     """
     try:
         # Normalize working_directory absolute path
@@ -50,19 +53,25 @@ def get_files_info(working_directory, directory="."):
         # List directory contents (sorted for deterministic output)
         entries = sorted(os.listdir(target))
 
-        lines = []
+        sizes = []
+        dirs = []
         for name in entries:
             full_path = os.path.join(target, name)
             try:
-                is_dir = os.path.isdir(full_path)
+                dirs.append(os.path.isdir(full_path))
                 # os.path.getsize works for files and directories (on many OSes directory size is small)
-                size = os.path.getsize(full_path)
-                lines.append(f"- {name}: file_size={size} bytes, is_dir={is_dir}")
+                sizes.append(os.path.getsize(full_path))
             except Exception as e:
                 # If an error occurs while inspecting an entry, return an Error string
                 return f"Error: {e}"
 
-        return "\n".join(lines)
+        if compact:
+            return {"name": entries, "size": sizes, "is_dir": dirs}
+
+        return "\n".join(
+            f"- {name}: file_size={size} bytes, is_dir={is_dir}"
+            for name, size, is_dir in zip(entries, sizes, dirs)
+        )
 
     except Exception as e:
         # Catch-all: always return an error string (never raise)
@@ -0,0 +1,145 @@
+# functions/hedging.py
+import asyncio
+import threading
+import time
+from collections import deque
+
+from .config import (
+    HEDGE_PERCENTILE,
+    HEDGE_WINDOW,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_INITIAL_DELAY,
+    HEDGE_MAX_RATE,
+)
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Hedger:
+    """
+    Hedged requests: if a call hasn't answered within the recent HEDGE_PERCENTILE
+    latency (per key, e.g. per model), send a duplicate and take whichever
+    answers first; the other is cancelled.
+
+    Calls are coroutines (client.aio...) run on one private event loop thread,
+    so the async client's connection pool always lives on the same loop and
+    cancelling the loser really aborts its HTTP request. call() blocks the
+    calling thread, so it can be used from the synchronous agent loop.
+
+    At most HEDGE_MAX_RATE of calls may fire a hedge (at least one is allowed).
+
+    Counters recorded in `metrics` (if given):
+      hedge.calls, hedge.fired, hedge.won,
+      hedge.latency_saved_est (seconds; the cancelled primary is estimated as the
+        mean of recent latencies longer than it had already run, 0 if none were)
+      timings: hedge.threshold_seconds
+    """
+
+    def __init__(self, metrics=None, percentile=HEDGE_PERCENTILE, window=HEDGE_WINDOW,
+                 min_samples=HEDGE_MIN_SAMPLES, initial_delay=HEDGE_INITIAL_DELAY,
+                 max_rate=HEDGE_MAX_RATE):
+        self.metrics = metrics
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.max_rate = max_rate
+
+        self._lock = threading.Lock()
+        self._latencies = {}  # key -> deque of recent successful latencies
+        self._calls = 0
+        self._fired = 0
+        self._loop = None
+
+    def _incr(self, name, amount=1):
+        if self.metrics is not None:
+            self.metrics.incr(name, amount)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True, name="hedger").start()
+            return self._loop
+
+    def threshold(self, key=None):
+        """Seconds to wait before hedging: recent percentile latency, or the initial delay."""
+        with self._lock:
+            samples = list(self._latencies.get(key, ()))
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return _percentile(samples, self.percentile)
+
+    def _record(self, key, seconds):
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def _may_hedge(self):
+        with self._lock:
+            if self._fired < max(1, int(self.max_rate * self._calls)):
+                self._fired += 1
+                return True
+            return False
+
+    def call(self, make_coro, key=None):
+        """
+        Run make_coro() (a zero-argument function returning a coroutine) with
+        hedging and return its result. Exceptions propagate if every attempt fails.
+        """
+        with self._lock:
+            self._calls += 1
+        self._incr("hedge.calls")
+        future = asyncio.run_coroutine_threadsafe(self._race(make_coro, key), self._ensure_loop())
+        return future.result()
+
+    async def _timed(self, make_coro):
+        started = time.perf_counter()
+        result = await make_coro()
+        return result, time.perf_counter() - started
+
+    async def _race(self, make_coro, key):
+        started = time.perf_counter()
+        threshold = self.threshold(key)
+        if self.metrics is not None:
+            self.metrics.observe("hedge.threshold_seconds", threshold)
+
+        primary = asyncio.ensure_future(self._timed(make_coro))
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        hedge = None
+        if not done and self._may_hedge():
+            self._incr("hedge.fired")
+            hedge = asyncio.ensure_future(self._timed(make_coro))
+
+        pending = {t for t in (primary, hedge) if t is not None}
+        winner, error = None, None
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = task
+                    break
+                error = task.exception()
+        for task in pending:
+            task.cancel()
+        if winner is None:
+            raise error
+
+        result, seconds = winner.result()
+        if winner is hedge:
+            self._incr("hedge.won")
+        if winner is hedge and primary in pending:
+            # The cancelled primary had run for `elapsed` already; estimate how much
+            # longer it would have taken from recent calls that were at least as slow.
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                slower = [x for x in self._latencies.get(key, ()) if x > elapsed]
+            if slower:
+                self._incr("hedge.latency_saved_est", sum(slower) / len(slower) - elapsed)
+            # One sample per call: the primary's elapsed time, a lower bound on its
+            # latency. Recording the fast hedge instead would drag the threshold down.
+            seconds = elapsed
+        self._record(key, seconds)
+        return result
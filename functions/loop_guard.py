@@ -0,0 +1,87 @@
+# functions/loop_guard.py
+import hashlib
+import json
+import os
+
+from .config import LOOP_GUARD_MAX_REPEATS, SNAPSHOT_IGNORE
+
+# Tools whose result depends only on their args and the workspace contents.
+# write_file is never short-circuited.
+GUARDED_TOOLS = ("get_files_info", "get_file_content", "run_python_file")
+
+REPEAT_NOTE = (
+    "[Note: this exact call was already made and no files have changed since, "
+    "so this is the previous result. Try something different.]"
+)
+
+
+def workspace_fingerprint(working_directory):
+    """
+    Cheap fingerprint of a working directory: sha256 over (relpath, mtime_ns, size)
+    of every file. Changes whenever a file is written, created or removed.
+    """
+    h = hashlib.sha256()
+    root = os.path.realpath(working_directory)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SNAPSHOT_IGNORE)
+        for name in sorted(filenames):
+            full_path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+            h.update(f"{os.path.relpath(full_path, root)}\0{st.st_mtime_ns}\0{st.st_size}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+class LoopGuard:
+    """
+    Detect the model repeating a tool call while the workspace is unchanged.
+
+    check() returns the cached result (with REPEAT_NOTE) for a repeat, so the
+    tool isn't re-run. After `max_repeats` repeats of one call, `tripped`
+    holds a diagnostic and the agent loop should stop.
+
+    Counters recorded in `metrics` (if given): loop.short_circuits
+    """
+
+    def __init__(self, metrics=None, max_repeats=LOOP_GUARD_MAX_REPEATS):
+        self.metrics = metrics
+        self.max_repeats = max_repeats
+        self.tripped = None
+        self._results = {}  # key -> result (string, or dict in compact mode)
+        self._repeats = {}  # key -> number of repeats seen
+
+    def _key(self, name, args):
+        wd = args["working_directory"]
+        call_args = {k: v for k, v in args.items() if k not in ("working_directory", "metrics", "compact")}
+        return (name, json.dumps(call_args, sort_keys=True, default=str), wd, workspace_fingerprint(wd))
+
+    def check(self, name, args):
+        """
+        Return (key, cached_result_or_None). Pass key to record() after running the tool.
+        """
+        if name not in GUARDED_TOOLS:
+            return None, None
+        key = self._key(name, args)
+        if key not in self._results:
+            return key, None
+
+        repeats = self._repeats.get(key, 0) + 1
+        self._repeats[key] = repeats
+        if self.metrics is not None:
+            self.metrics.incr("loop.short_circuits")
+        if repeats >= self.max_repeats:
+            self.tripped = (
+                f"Stopped: {name}({key[1]}) was repeated {repeats} times "
+                f"with no workspace changes in between."
+            )
+        previous = self._results[key]
+        if isinstance(previous, dict):
+            return key, {**previous, "note": REPEAT_NOTE}
+        return key, f"{previous}\n\n{REPEAT_NOTE}"
+
+    def record(self, key, result):
+        """Remember the result of a freshly executed call (key from check())."""
+        if key is not None:
+            self._results[key] = result
@@ -0,0 +1,55 @@
+# functions/metrics.py
+import threading
+
+
+class Metrics:
+    """
+    Thread-safe counters and timings for one agent session.
+
+    counters: name -> int/float total (incr)
+    timings:  name -> list of observed values (observe), e.g. seconds or bytes
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timings = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        with self._lock:
+            self.timings.setdefault(name, []).append(value)
+
+    def get(self, name, default=0):
+        with self._lock:
+            return self.counters.get(name, default)
+
+    def snapshot(self):
+        """Return a copy: {"counters": {...}, "timings": {name: [values]}}."""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "timings": {k: list(v) for k, v in self.timings.items()},
+            }
+
+    def report(self):
+        """
+        Human-readable summary, one metric per line (sorted by name).
+        Timings are summarized as count/total/max.
+        """
+        snap = self.snapshot()
+        lines = []
+        for name in sorted(snap["counters"]):
+            value = snap["counters"][name]
+            if isinstance(value, float):
+                value = f"{value:.6g}"
+            lines.append(f"{name}: {value}")
+        for name in sorted(snap["timings"]):
+            values = snap["timings"][name]
+            if not values:
+                continue
+            lines.append(f"{name}: n={len(values)} total={sum(values):.3f} max={max(values):.3f}")
+        return "\n".join(lines)
@@ -0,0 +1,162 @@
+# functions/prefetch.py
+import os
+import threading
+from collections import OrderedDict
+
+from .config import (
+    MAX_CHARS,
+    PREFETCH_MAX_FILES,
+    PREFETCH_MAX_FILE_BYTES,
+    PREFETCH_MAX_ENTRIES,
+    PREFETCH_EXTENSIONS,
+)
+from .get_file_content import truncate_content
+
+
+class Prefetcher:
+    """
+    Speculatively load small text files after a directory listing.
+
+    The model usually follows `get_files_info` with `get_file_content` on a
+    few of the small files it just saw. `schedule()` reads those files on a
+    background thread so the later read can be answered from memory.
+
+    Cached entries remember (st_mtime_ns, st_size); a lookup re-stats the
+    file and drops the entry if it changed, so edits made through
+    write_file are never hidden by a stale copy.
+
+    Counters recorded in `metrics` (if given):
+      prefetch.files_loaded, prefetch.bytes_loaded,
+      prefetch.hits, prefetch.misses, prefetch.stale
+    """
+
+    def __init__(self, metrics=None, max_files=PREFETCH_MAX_FILES,
+                 max_file_bytes=PREFETCH_MAX_FILE_BYTES,
+                 max_entries=PREFETCH_MAX_ENTRIES,
+                 extensions=PREFETCH_EXTENSIONS):
+        self.metrics = metrics
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.max_entries = max_entries
+        self.extensions = tuple(extensions)
+
+        self._lock = threading.Lock()
+        # realpath -> (mtime_ns, size, content); insertion order = eviction order
+        self._cache = OrderedDict()
+        self._threads = []
+
+    def _incr(self, name, amount=1):
+        if self.metrics is not None:
+            self.metrics.incr(name, amount)
+
+    def _candidates(self, target):
+        """Pick small files with a known text extension, smallest first."""
+        found = []
+        for name in os.listdir(target):
+            if not name.endswith(self.extensions):
+                continue
+            full_path = os.path.join(target, name)
+            if not os.path.isfile(full_path):
+                continue
+            st = os.stat(full_path)
+            if st.st_size > self.max_file_bytes:
+                continue
+            found.append((st.st_size, name, full_path))
+        found.sort()
+        return [p for _, _, p in found[: self.max_files]]
+
+    def _load(self, target):
+        try:
+            paths = self._candidates(target)
+        except OSError:
+            return
+
+        for path in paths:
+            real = os.path.realpath(path)
+            with self._lock:
+                if real in self._cache:
+                    continue
+            try:
+                st = os.stat(real)
+                with open(real, "r", encoding="utf-8", errors="replace") as f:
+                    content = f.read(MAX_CHARS + 1)
+            except OSError:
+                continue
+
+            with self._lock:
+                self._cache[real] = (st.st_mtime_ns, st.st_size, content)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            self._incr("prefetch.files_loaded")
+            self._incr("prefetch.bytes_loaded", st.st_size)
+
+    def schedule(self, working_directory, directory="."):
+        """
+        Start loading files from `directory` (relative to working_directory)
+        on a daemon thread. Paths outside working_directory are ignored.
+        """
+        wd_real = os.path.realpath(working_directory)
+        target = os.path.realpath(os.path.join(working_directory, directory))
+        try:
+            if os.path.commonpath([wd_real, target]) != wd_real:
+                return
+        except ValueError:
+            return
+        if not os.path.isdir(target):
+            return
+
+        t = threading.Thread(target=self._load, args=(target,), daemon=True)
+        t.start()
+        self._threads = [th for th in self._threads if th.is_alive()] + [t]
+
+    def wait(self, timeout=None):
+        """Block until scheduled loads finish (used by tests/scripts)."""
+        for t in list(self._threads):
+            t.join(timeout)
+
+    def lookup(self, working_directory, file_path):
+        """
+        Return the get_file_content() result for file_path if it is cached
+        and unchanged on disk, else None (caller falls back to reading it).
+        """
+        wd_real = os.path.realpath(working_directory)
+        target = os.path.realpath(os.path.join(working_directory, file_path))
+        try:
+            if os.path.commonpath([wd_real, target]) != wd_real:
+                return None
+        except ValueError:
+            return None
+
+        with self._lock:
+            entry = self._cache.get(target)
+        if entry is None:
+            self._incr("prefetch.misses")
+            return None
+
+        mtime_ns, size, content = entry
+        try:
+            st = os.stat(target)
+        except OSError:
+            st = None
+        if st is None or st.st_mtime_ns != mtime_ns or st.st_size != size:
+            with self._lock:
+                self._cache.pop(target, None)
+            self._incr("prefetch.stale")
+            self._incr("prefetch.misses")
+            return None
+
+        self._incr("prefetch.hits")
+        return truncate_content(content, file_path)
+
+    def invalidate(self, working_directory, file_path):
+        """Drop a cached file (call after writing it)."""
+        target = os.path.realpath(os.path.join(working_directory, file_path))
+        with self._lock:
+            self._cache.pop(target, None)
+
+    def hit_rate(self):
+        if self.metrics is None:
+            return None
+        hits = self.metrics.get("prefetch.hits")
+        total = hits + self.metrics.get("prefetch.misses")
+        return hits / total if total else None
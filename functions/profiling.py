@@ -0,0 +1,63 @@
+# functions/profiling.py
+import os
+import pstats
+import sysconfig
+
+from .config import PROFILE_TOP_N
+
+# Frames that belong to the profiler/launcher rather than the user's script
+# (matched as stdlib paths, so a workspace file named e.g. profile.py still shows up)
+_STDLIB = sysconfig.get_paths()["stdlib"]
+_NOISE_FILES = {
+    os.path.realpath(os.path.join(_STDLIB, name))
+    for name in ("cProfile.py", "profile.py", "runpy.py", "pkgutil.py")
+}
+_NOISE_FUNCS = ("<built-in method builtins.exec>", "<method 'disable' of '_lsprof.Profiler' objects>")
+# Import machinery and frozen stdlib modules (e.g. "<frozen importlib._bootstrap_external>")
+_NOISE_PREFIXES = ("<frozen importlib._bootstrap", "<frozen zipimport", "<frozen runpy")
+
+
+def _label(func, wd_real):
+    """'pkg/calculator.py:22(_evaluate_infix)' with paths relative to the working directory."""
+    filename, line, name = func
+    if filename == "~":  # built-ins
+        return name
+    path = os.path.realpath(filename)
+    if os.path.commonpath([wd_real, path]) == wd_real:
+        filename = os.path.relpath(path, wd_real)
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{line}({name})"
+
+
+def top_functions(stats_path, working_directory, n=PROFILE_TOP_N):
+    """
+    Read a cProfile stats file and return the top-n functions two ways:
+      {"cumulative": [[label, ncalls, tottime, cumtime], ...],
+       "self":       [[label, ncalls, tottime, cumtime], ...]}
+    Times are seconds rounded to 4 places.
+    """
+    wd_real = os.path.realpath(working_directory)
+    stats = pstats.Stats(stats_path)
+    rows = []
+    for func, (cc, ncalls, tottime, cumtime, _callers) in stats.stats.items():
+        if (os.path.realpath(func[0]) in _NOISE_FILES or func[2] in _NOISE_FUNCS
+                or func[0].startswith(_NOISE_PREFIXES)):
+            continue
+        rows.append([_label(func, wd_real), ncalls, round(tottime, 4), round(cumtime, 4)])
+
+    return {
+        "cumulative": sorted(rows, key=lambda r: r[3], reverse=True)[:n],
+        "self": sorted(rows, key=lambda r: r[2], reverse=True)[:n],
+    }
+
+
+def format_profile(tables):
+    """Render top_functions() output as two small fixed-width tables."""
+    sections = []
+    for key, title in (("cumulative", "cumulative time"), ("self", "self time")):
+        lines = [f"PROFILE (top {len(tables[key])} by {title}):", "   ncalls   tottime   cumtime  function"]
+        for label, ncalls, tottime, cumtime in tables[key]:
+            lines.append(f"{ncalls:>9} {tottime:>9.4f} {cumtime:>9.4f}  {label}")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
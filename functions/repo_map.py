@@ -0,0 +1,133 @@
+# functions/repo_map.py
+import ast
+import hashlib
+import json
+import os
+
+from .config import REPO_MAP_DIR, REPO_MAP_TOKEN_BUDGET, SNAPSHOT_IGNORE
+
+
+def _signature(node):
+    """'name(a, b=1, *args)' for a FunctionDef / AsyncFunctionDef."""
+    prefix = "async " if isinstance(node, ast.AsyncFunctionDef) else ""
+    return f"{prefix}{node.name}({ast.unparse(node.args)})"
+
+
+def _def_line(sig):
+    """'def f(x)' / 'async def f(x)' for a _signature() string."""
+    if sig.startswith("async "):
+        return f"async def {sig[len('async '):]}"
+    return f"def {sig}"
+
+
+def _index_python(full_path):
+    """Classes (with methods) and top-level functions of one Python file."""
+    with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+        tree = ast.parse(f.read(), filename=full_path)
+
+    classes, functions = [], []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append({"sig": _signature(node), "line": node.lineno})
+        elif isinstance(node, ast.ClassDef):
+            methods = [
+                {"sig": _signature(item), "line": item.lineno}
+                for item in node.body
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+            ]
+            classes.append({"name": node.name, "line": node.lineno, "methods": methods})
+    return {"classes": classes, "functions": functions}
+
+
+def cache_path(working_directory, root=REPO_MAP_DIR):
+    wd_real = os.path.realpath(working_directory)
+    tag = hashlib.sha256(wd_real.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(root, f"repo_map-{os.path.basename(wd_real)}-{tag}.json")
+
+
+def build_repo_map(working_directory, cache_file=None, metrics=None):
+    """
+    Index every file under working_directory:
+      {relpath: {"mtime_ns", "size", ["classes", "functions"] | ["error"]}}
+
+    The index is cached as JSON (cache_path() by default) and only files whose
+    mtime/size changed since the cached run are re-parsed.
+    Counters recorded in `metrics` (if given): repo_map.files_parsed, repo_map.files_reused
+    """
+    wd_real = os.path.realpath(working_directory)
+    cache_file = cache_file or cache_path(working_directory)
+
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+
+    index = {}
+    for dirpath, dirnames, filenames in os.walk(wd_real):
+        dirnames[:] = sorted(d for d in dirnames if d not in SNAPSHOT_IGNORE)
+        for name in sorted(filenames):
+            full_path = os.path.join(dirpath, name)
+            rel = os.path.relpath(full_path, wd_real)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+
+            old = cached.get(rel)
+            if old and old["mtime_ns"] == st.st_mtime_ns and old["size"] == st.st_size:
+                index[rel] = old
+                if metrics is not None:
+                    metrics.incr("repo_map.files_reused")
+                continue
+
+            entry = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+            if name.endswith(".py"):
+                try:
+                    entry.update(_index_python(full_path))
+                except (SyntaxError, ValueError) as e:
+                    entry["error"] = f"unparseable: {e.msg if isinstance(e, SyntaxError) else e}"
+                if metrics is not None:
+                    metrics.incr("repo_map.files_parsed")
+            index[rel] = entry
+
+    if index != cached:
+        os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+        tmp = f"{cache_file}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, cache_file)
+    return index
+
+
+def summarize(index, max_tokens=REPO_MAP_TOKEN_BUDGET):
+    """
+    Render the index as compact text for the system prompt, e.g.
+
+      pkg/calculator.py (1721 bytes)
+        class Calculator:
+          evaluate(self, expression)  L16
+
+    Python files come first; stops at roughly max_tokens (4 chars/token)
+    and says how many files were left out.
+    """
+    budget = max_tokens * 4
+    paths = sorted(index, key=lambda p: (not p.endswith(".py"), p))
+    lines, used = [], 0
+    for i, rel in enumerate(paths):
+        entry = index[rel]
+        block = [f"{rel} ({entry['size']} bytes)"]
+        if "error" in entry:
+            block.append(f"  ({entry['error']})")
+        for cls in entry.get("classes", []):
+            block.append(f"  class {cls['name']}:  L{cls['line']}")
+            block.extend(f"    {m['sig']}  L{m['line']}" for m in cls["methods"])
+        block.extend(f"  {_def_line(fn['sig'])}  L{fn['line']}" for fn in entry.get("functions", []))
+
+        size = sum(len(line) + 1 for line in block)
+        if used + size > budget:
+            lines.append(f"... ({len(paths) - i} more files not shown)")
+            break
+        lines.extend(block)
+        used += size
+    return "\n".join(lines)
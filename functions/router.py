@@ -0,0 +1,130 @@
+# functions/router.py
+import json
+
+from .config import MODEL_DEFAULT, MODEL_PRICES, ROUTING_RULES, ROUTER_FAILURE_WINDOW
+
+
+def message_chars(messages):
+    """Rough size of a conversation: characters of text, call args and tool results."""
+    total = 0
+    for content in messages:
+        for part in getattr(content, "parts", None) or []:
+            if getattr(part, "text", None):
+                total += len(part.text)
+            if getattr(part, "function_call", None):
+                total += len(json.dumps(part.function_call.args or {}, default=str))
+            if getattr(part, "function_response", None):
+                total += len(json.dumps(part.function_response.response or {}, default=str, ensure_ascii=False))
+    return total
+
+
+def malformed_calls(function_calls, declarations):
+    """
+    Return a list of problems with the model's function calls: unknown tool
+    names or missing required arguments. Empty list = all calls look valid.
+    """
+    schemas = {d.name: d for d in declarations}
+    problems = []
+    for fc in function_calls or []:
+        decl = schemas.get(fc.name)
+        if decl is None:
+            problems.append(f"unknown function {fc.name}")
+            continue
+        required = (decl.parameters.required if decl.parameters else None) or []
+        missing = [r for r in required if r not in (fc.args or {})]
+        if missing:
+            problems.append(f"{fc.name} missing {', '.join(missing)}")
+    return problems
+
+
+class Router:
+    """
+    Pick the model for each agent iteration.
+
+    Rules (ROUTING_RULES by default) are checked in order; the first whose
+    conditions all hold decides the model, otherwise MODEL_DEFAULT is used.
+    Conditions:
+      step_at_most           iteration number (1-based) <= N
+      previous_tools_within  every tool called last iteration is in this list
+      prompt_chars_at_most   conversation size so far <= N characters
+      failures_at_least      malformed responses in the last ROUTER_FAILURE_WINDOW steps >= N
+
+    observe() records latency, tokens and cost per model in `metrics`:
+      route.<model>.calls / .errors / .prompt_tokens / .output_tokens / .cost_usd,
+      route.<model>.seconds (timings), route.rule.<name> (how often each rule fired)
+    """
+
+    def __init__(self, rules=ROUTING_RULES, default=MODEL_DEFAULT, metrics=None):
+        self.rules = rules
+        self.default = default
+        self.metrics = metrics
+        self._previous_tools = []
+        self._failures = []  # steps whose response was malformed
+
+    def _matches(self, when, step, prompt_chars):
+        recent = [s for s in self._failures if s > step - 1 - ROUTER_FAILURE_WINDOW]
+        checks = {
+            "step_at_most": lambda n: step <= n,
+            "previous_tools_within": lambda tools: bool(self._previous_tools)
+            and all(t in tools for t in self._previous_tools),
+            "prompt_chars_at_most": lambda n: prompt_chars <= n,
+            "failures_at_least": lambda n: len(recent) >= n,
+        }
+        return all(checks[key](value) for key, value in when.items())
+
+    def choose(self, step, messages):
+        """Return (model, rule_name) for this iteration."""
+        prompt_chars = message_chars(messages)
+        for rule in self.rules:
+            if self._matches(rule["when"], step, prompt_chars):
+                if self.metrics is not None:
+                    self.metrics.incr(f"route.rule.{rule['name']}")
+                return rule["model"], rule["name"]
+        return self.default, "default"
+
+    def observe(self, step, model, seconds, response=None, tool_names=(), malformed=(), error=False):
+        """Record one model call's outcome so later choices (and reports) can use it."""
+        self._previous_tools = list(tool_names)
+        if malformed or error:
+            self._failures.append(step)
+
+        if self.metrics is None:
+            return
+        prefix = f"route.{model}"
+        self.metrics.incr(f"{prefix}.calls")
+        self.metrics.observe(f"{prefix}.seconds", seconds)
+        if malformed or error:
+            self.metrics.incr(f"{prefix}.errors")
+
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None) or 0
+        output_tokens = getattr(usage, "candidates_token_count", None) or 0
+        self.metrics.incr(f"{prefix}.prompt_tokens", prompt_tokens)
+        self.metrics.incr(f"{prefix}.output_tokens", output_tokens)
+        input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        cost = (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+        self.metrics.incr(f"{prefix}.cost_usd", cost)
+
+    def report(self):
+        """Per-model summary lines: calls, errors, mean latency, tokens and cost."""
+        if self.metrics is None:
+            return ""
+        snap = self.metrics.snapshot()
+        counters, timings = snap["counters"], snap["timings"]
+        models = sorted(
+            k[len("route."):-len(".calls")]
+            for k in counters
+            if k.startswith("route.") and k.endswith(".calls")
+        )
+        lines = []
+        for model in models:
+            p = f"route.{model}"
+            seconds = timings.get(f"{p}.seconds", [])
+            mean = sum(seconds) / len(seconds) if seconds else 0.0
+            lines.append(
+                f"{model}: calls={counters.get(f'{p}.calls', 0)} errors={counters.get(f'{p}.errors', 0)} "
+                f"mean_latency={mean:.2f}s max_latency={max(seconds, default=0.0):.2f}s "
+                f"tokens={counters.get(f'{p}.prompt_tokens', 0)}/{counters.get(f'{p}.output_tokens', 0)} "
+                f"cost=${counters.get(f'{p}.cost_usd', 0.0):.5f}"
+            )
+        return "\n".join(lines)
@@ -1,14 +1,32 @@
 # functions/run_python.py
 import os
 import sys
+import signal
 import subprocess
+import tempfile
+import threading
+import time
+
+try:
+    import resource  # POSIX only
+except ImportError:
+    resource = None
+
+from .config import (
+    RUN_TIMEOUT,
+    RUN_MAX_ADDRESS_SPACE_MB,
+    RUN_MAX_CPU_SECONDS,
+    RUN_MAX_OPEN_FILES,
+    RUN_MAX_PROCESSES,
+)
+from .profiling import top_functions, format_profile
 
 # Ch3.3 block added
 from google.genai import types
 
 schema_run_python_file = types.FunctionDeclaration(
     name="run_python_file",
-    description="Executes a Python file in the working directory with optional arguments.",
+    description="Executes a Python file in the working directory with optional arguments. Set profile=true to also get a table of the slowest functions (cProfile).",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -21,19 +39,245 @@ schema_run_python_file = types.FunctionDeclaration(
                 items=types.Schema(type=types.Type.STRING),
                 description="Optional list of arguments to pass to the Python file."
             ),
+            "profile": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Run under cProfile and return the top functions by cumulative and self time. Use when asked to make code faster."
+            ),
         },
         required=["file_path"],
     ),
 )
 
 
+# Runs in the child: apply "RLIMIT_X=value" limits, then exec the real command.
+# Done in a launcher instead of preexec_fn, which is unsafe when the parent has threads.
+_LIMIT_LAUNCHER = """
+import os, resource, sys
+sep = sys.argv.index("--")
+for spec in sys.argv[1:sep]:
+    name, value = spec.split("=")
+    res = getattr(resource, name, None)
+    if res is None:
+        continue
+    value = int(value)
+    soft, hard = resource.getrlimit(res)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.setrlimit(res, (value, value))
+os.execv(sys.executable, [sys.executable] + sys.argv[sep + 1:])
+"""
+
+# Runs in the child: profile the script at argv[2] and dump stats to argv[1].
+# Unlike `python -m cProfile`, the script's SystemExit status is passed on.
+# sys.path[0] for -c is the cwd (the workspace); it is dropped before importing
+# the profiler so a workspace profile.py can't shadow the stdlib one, and the
+# profiler modules are forgotten so the script can still import its own.
+_PROFILE_RUNNER = """
+import sys
+sys.path.pop(0)
+import cProfile, os, types
+profiler = cProfile.Profile()
+for name in ("cProfile", "profile"):
+    sys.modules.pop(name, None)
+stats_path, path = sys.argv[1], sys.argv[2]
+sys.argv = sys.argv[2:]
+sys.path.insert(0, os.path.dirname(path))
+with open(path, "rb") as f:
+    code = compile(f.read(), path, "exec")
+main = types.ModuleType("__main__")
+main.__file__ = path
+sys.modules["__main__"] = main
+status = 0
+try:
+    profiler.runctx(code, main.__dict__, None)
+except SystemExit as e:
+    status = e.code
+finally:
+    profiler.dump_stats(stats_path)
+sys.exit(status)
+"""
+
+
+def _limit_specs():
+    """Return ["RLIMIT_AS=...", ...] for the configured (non-None) limits."""
+    limits = {
+        "RLIMIT_AS": RUN_MAX_ADDRESS_SPACE_MB and RUN_MAX_ADDRESS_SPACE_MB * 1024 * 1024,
+        "RLIMIT_CPU": RUN_MAX_CPU_SECONDS,
+        "RLIMIT_NOFILE": RUN_MAX_OPEN_FILES,
+        "RLIMIT_NPROC": RUN_MAX_PROCESSES,
+    }
+    return [f"{name}={int(value)}" for name, value in limits.items() if value]
+
+
+def _drain(stream, sink):
+    sink.append(stream.read())
+    stream.close()
+
+
+def _kill_group(pgid):
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _peak_rss_kb(pid):
+    """
+    VmHWM (peak resident set, KiB) of a live process from /proc, or None.
+
+    Unlike ru_maxrss, which a child inherits from the forked parent, VmHWM is
+    reset at exec, so it measures the script rather than the agent.
+    """
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _run_governed(cmd, cwd, timeout):
+    """
+    Run cmd in its own session/process group with rlimits applied.
 
-def run_python_file(working_directory, file_path, args=None):
+    Returns: (returncode, stdout, stderr, usage_dict, timed_out)
+      usage_dict = {"wall_seconds", "cpu_seconds", "peak_rss_mb"}
+    peak_rss_mb is sampled from /proc while waiting (so a spike in the last
+    few milliseconds can be missed); without /proc it falls back to ru_maxrss.
+    Any processes the script left behind in its group are killed when it
+    exits or times out.
+    """
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", _LIMIT_LAUNCHER] + _limit_specs() + ["--"] + cmd[1:],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        cwd=cwd,
+        start_new_session=True,
+    )
+
+    # Read both pipes in the background so a chatty child can't block on a full pipe
+    out, err = [], []
+    readers = [
+        threading.Thread(target=_drain, args=(proc.stdout, out), daemon=True),
+        threading.Thread(target=_drain, args=(proc.stderr, err), daemon=True),
+    ]
+    for t in readers:
+        t.start()
+
+    # Reap with wait4 so we get this child's own rusage (not every child's)
+    deadline = started + timeout
+    timed_out = False
+    peak_kb = None
+    while True:
+        sample = _peak_rss_kb(proc.pid)
+        if sample is not None:
+            peak_kb = max(peak_kb or 0, sample)
+        pid, status, ru = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            break
+        if time.perf_counter() >= deadline:
+            timed_out = True
+            _kill_group(proc.pid)
+            pid, status, ru = os.wait4(proc.pid, 0)
+            break
+        time.sleep(0.01)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - started
+
+    # Clean up anything the script forked that is still holding the pipes
+    _kill_group(proc.pid)
+    for t in readers:
+        t.join()
+
+    if peak_kb is not None:
+        rss_bytes = peak_kb * 1024
+    else:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        rss_bytes = ru.ru_maxrss if sys.platform == "darwin" else ru.ru_maxrss * 1024
+    usage = {
+        "wall_seconds": wall,
+        "cpu_seconds": ru.ru_utime + ru.ru_stime,
+        "peak_rss_mb": rss_bytes / (1024 * 1024),
+    }
+    return proc.returncode, "".join(out), "".join(err), usage, timed_out
+
+
+def _record_usage(metrics, usage, timed_out):
+    if metrics is None:
+        return
+    metrics.incr("run.count")
+    if timed_out:
+        metrics.incr("run.timeouts")
+    metrics.observe("run.wall_seconds", usage["wall_seconds"])
+    if "cpu_seconds" in usage:
+        metrics.observe("run.cpu_seconds", usage["cpu_seconds"])
+        metrics.observe("run.peak_rss_mb", usage["peak_rss_mb"])
+
+
+def format_usage(usage):
+    """One-line summary of a usage dict from _run_governed."""
+    line = f"Resource usage: wall={usage['wall_seconds']:.2f}s"
+    if "cpu_seconds" in usage:
+        line += f" cpu={usage['cpu_seconds']:.2f}s peak_rss={usage['peak_rss_mb']:.1f}MB"
+    return line
+
+
+def _execute(cmd, cwd, metrics):
+    """Run cmd with the configured limits. Returns (returncode, stdout, stderr, usage, timed_out)."""
+    if resource is not None:
+        returncode, stdout, stderr, usage, timed_out = _run_governed(cmd, cwd, RUN_TIMEOUT)
+        _record_usage(metrics, usage, timed_out)
+        return returncode, stdout, stderr, usage, timed_out
+
+    # No rlimits / process groups on this platform: plain timeout only
+    started = time.perf_counter()
+    completed = subprocess.run(
+        cmd,
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+        timeout=RUN_TIMEOUT
+    )
+    usage = {"wall_seconds": time.perf_counter() - started}
+    _record_usage(metrics, usage, False)
+    return completed.returncode, completed.stdout, completed.stderr, usage, False
+
+
+def _compact_result(stdout, stderr, returncode, usage):
+    """Structured result for compact mode; empty streams are omitted."""
+    result = {"exit_code": returncode}
+    if stdout:
+        result["stdout"] = stdout
+    if stderr:
+        result["stderr"] = stderr
+    result["wall_s"] = round(usage["wall_seconds"], 2)
+    if "cpu_seconds" in usage:
+        result["cpu_s"] = round(usage["cpu_seconds"], 2)
+        result["rss_mb"] = round(usage["peak_rss_mb"], 1)
+    return result
+
+
+def run_python_file(working_directory, file_path, args=None, profile=False, metrics=None, compact=False):
     """
     Execute a Python file inside working_directory with optional args.
 
+    On POSIX the child runs in its own process group under the RUN_MAX_*
+    rlimits from config; on timeout the whole group is killed. Wall time,
+    CPU time and peak RSS are appended to the result and, if `metrics` is
+    given, recorded there.
+
+    With profile=True the script runs under cProfile in the child and the
+    top functions by cumulative and self time are added to the result.
+
     Returns:
-      - On success: a string containing STDOUT and STDERR blocks, and exit code if non-zero.
+      - On success: a string containing STDOUT and STDERR blocks, exit code if non-zero,
+        and a resource usage line.
+        With compact=True, a dict instead:
+        {"stdout", "stderr", "exit_code", "wall_s", ["cpu_s", "rss_mb"], ["profile"]}
       - On failure or guardrail violation: an Error:... string.
     """
     if args is None:
@@ -64,28 +308,46 @@ def run_python_file(working_directory, file_path, args=None):
         # Build command using the same Python interpreter that's running this code (keeps venv)
         cmd = [sys.executable, target] + list(args)
 
-        # Execute with timeout, capture output, set cwd to working directory
-        completed = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            cwd=wd_real,
-            timeout=30
-        )
+        stats_path = None
+        if profile:
+            # Stats go to a temp file outside the workspace so the script can't see them
+            fd, stats_path = tempfile.mkstemp(prefix="agent-profile-", suffix=".prof")
+            os.close(fd)
+            cmd = [sys.executable, "-c", _PROFILE_RUNNER, stats_path, target] + list(args)
+
+        try:
+            returncode, stdout, stderr, usage, timed_out = _execute(cmd, wd_real, metrics)
+            if timed_out:
+                return f'Error: executing Python file: Timeout after {RUN_TIMEOUT} seconds'
+            hotspots = None
+            if stats_path and os.path.getsize(stats_path) > 0:
+                hotspots = top_functions(stats_path, wd_real)
+        finally:
+            if stats_path:
+                os.remove(stats_path)
+
+        stdout = stdout.strip()
+        stderr = stderr.strip()
 
-        stdout = completed.stdout.strip()
-        stderr = completed.stderr.strip()
+        if compact:
+            result = _compact_result(stdout, stderr, returncode, usage)
+            if hotspots is not None:
+                result["profile"] = hotspots
+            return result
 
         parts = []
         if stdout:
             parts.append("STDOUT:\n" + stdout)
         if stderr:
             parts.append("STDERR:\n" + stderr)
-        if completed.returncode != 0:
-            parts.append(f"Process exited with code {completed.returncode}")
+        if returncode != 0:
+            parts.append(f"Process exited with code {returncode}")
 
         if not parts:
-            return "No output produced."
+            parts.append("No output produced.")
+        parts.append(format_usage(usage))
+        if hotspots is not None:
+            parts.append(format_profile(hotspots))
 
         # Join sections with blank line between them for readability
         return "\n\n".join(parts)
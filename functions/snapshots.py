@@ -0,0 +1,229 @@
+# functions/snapshots.py
+import hashlib
+import json
+import os
+import time
+
+from .config import SNAPSHOT_DIR, SNAPSHOT_IGNORE
+
+
+class SnapshotStore:
+    """
+    Content-addressed snapshots of a working directory, for rolling back agent edits.
+
+    Layout under <SNAPSHOT_DIR>/<workspace>-<hash>/:
+      objects/ab/cdef...   one file per distinct content (sha256), stored once
+      snapshots/000001.json  {"id", "label", "created", "files": {relpath: digest}}
+      index.json           {relpath: [mtime_ns, size, digest]} as of the last walk
+
+    The index remembers (mtime_ns, size, digest) per file, so a snapshot
+    only hashes and copies files whose stat changed since the last one. It is
+    saved to index.json and reused by the next store for the same directory,
+    so a new session or workspace.py run only stats an unchanged tree. write_file snapshots refresh just the target path (plus the paths
+    the previous snapshot said were about to change); run_python_file
+    snapshots (paths=None) stat the tree, and the snapshot after one always
+    re-walks because the script may have touched anything.
+
+    Objects are copies rather than hardlinks: write_file and user scripts
+    overwrite files in place, which would rewrite a hardlinked object too.
+    """
+
+    def __init__(self, working_directory, root=SNAPSHOT_DIR, metrics=None):
+        self.wd_real = os.path.realpath(working_directory)
+        tag = hashlib.sha256(self.wd_real.encode("utf-8")).hexdigest()[:8]
+        self.root = os.path.join(root, f"{os.path.basename(self.wd_real)}-{tag}")
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.snapshots_dir = os.path.join(self.root, "snapshots")
+        self.index_path = os.path.join(self.root, "index.json")
+        self.metrics = metrics
+
+        self._index = self._load_index()  # relpath -> (mtime_ns, size, digest)
+        self._needs_walk = True
+        self._pending = set()  # relpaths the last snapshot's caller was about to modify
+
+    # --- storage helpers ---
+
+    def _load_index(self):
+        """Read index.json, keeping only entries whose object is still stored."""
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {
+            rel: tuple(entry)
+            for rel, entry in saved.items()
+            if os.path.exists(self._object_path(entry[2]))
+        }
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self.index_path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self.index_path)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _store_object(self, full_path):
+        """Hash a file and copy it into objects/ if that content is new. Returns the digest."""
+        with open(full_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        obj = self._object_path(digest)
+        if not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            tmp = f"{obj}.tmp{os.getpid()}"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, obj)
+            if self.metrics is not None:
+                self.metrics.incr("snapshot.bytes_stored", len(data))
+        if self.metrics is not None:
+            self.metrics.incr("snapshot.files_hashed")
+        return digest
+
+    def _relpath(self, path):
+        """Map a path relative to the working directory to a normalized relpath, or None if outside."""
+        target = os.path.realpath(os.path.join(self.wd_real, path))
+        rel = os.path.relpath(target, self.wd_real)
+        if rel == "." or rel.startswith(".." + os.sep) or rel == "..":
+            return None
+        return rel
+
+    def _refresh(self, rel):
+        """Bring the index entry for one relpath up to date with the disk."""
+        full_path = os.path.join(self.wd_real, rel)
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            self._index.pop(rel, None)
+            return
+        if not os.path.isfile(full_path):
+            self._index.pop(rel, None)
+            return
+        known = self._index.get(rel)
+        if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+            return
+        self._index[rel] = (st.st_mtime_ns, st.st_size, self._store_object(full_path))
+
+    def _walk(self):
+        seen = set()
+        for dirpath, dirnames, filenames in os.walk(self.wd_real):
+            dirnames[:] = [d for d in dirnames if d not in SNAPSHOT_IGNORE]
+            for name in filenames:
+                rel = os.path.relpath(os.path.join(dirpath, name), self.wd_real)
+                seen.add(rel)
+                self._refresh(rel)
+        for rel in list(self._index):
+            if rel not in seen:
+                del self._index[rel]
+
+    def _next_id(self):
+        ids = [int(n[:-5]) for n in self._snapshot_files()]
+        return max(ids, default=0) + 1
+
+    def _snapshot_files(self):
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        return sorted(n for n in os.listdir(self.snapshots_dir) if n.endswith(".json"))
+
+    # --- public API ---
+
+    def snapshot(self, label, paths=None):
+        """
+        Record the current state and return the new snapshot id.
+
+        paths: relpaths about to be modified (only these are re-checked),
+               or None if the next operation may change anything.
+        """
+        started = time.perf_counter()
+        rels = {r for r in (self._relpath(p) for p in paths or []) if r is not None}
+        if paths is None or self._needs_walk:
+            self._walk()
+        else:
+            # Files written since the previous snapshot, and the ones about to be
+            for rel in self._pending | rels:
+                self._refresh(rel)
+        self._needs_walk = paths is None
+        self._pending = rels
+
+        snap_id = self._next_id()
+        record = {
+            "id": snap_id,
+            "label": label,
+            "created": time.time(),
+            "files": {rel: entry[2] for rel, entry in self._index.items()},
+        }
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        with open(os.path.join(self.snapshots_dir, f"{snap_id:06d}.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        self._save_index()
+
+        if self.metrics is not None:
+            self.metrics.incr("snapshot.count")
+            self.metrics.observe("snapshot.seconds", time.perf_counter() - started)
+        return snap_id
+
+    def load(self, snap_id):
+        """Return the snapshot record for snap_id (raises FileNotFoundError if unknown)."""
+        with open(os.path.join(self.snapshots_dir, f"{int(snap_id):06d}.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def list_snapshots(self):
+        """Return [(id, label, created, file_count)] oldest first."""
+        out = []
+        for name in self._snapshot_files():
+            rec = self.load(int(name[:-5]))
+            out.append((rec["id"], rec["label"], rec["created"], len(rec["files"])))
+        return out
+
+    def current(self):
+        """Walk the working directory and return {relpath: digest}."""
+        self._walk()
+        self._save_index()
+        return {rel: entry[2] for rel, entry in self._index.items()}
+
+    def diff(self, snap_id, other_id=None):
+        """
+        Compare snapshot `snap_id` with `other_id` (or the current tree).
+        Returns {"added": [...], "removed": [...], "modified": [...]} of relpaths.
+        """
+        old = self.load(snap_id)["files"]
+        new = self.load(other_id)["files"] if other_id is not None else self.current()
+        return {
+            "added": sorted(p for p in new if p not in old),
+            "removed": sorted(p for p in old if p not in new),
+            "modified": sorted(p for p in old if p in new and old[p] != new[p]),
+        }
+
+    def rollback(self, snap_id):
+        """
+        Restore the working directory to snapshot `snap_id`.
+        The state being replaced is snapshotted first, so a rollback can be undone.
+
+        Returns: (undo_snapshot_id, diff_that_was_reverted)
+        """
+        target = self.load(snap_id)["files"]
+        undo_id = self.snapshot(f"before rollback to {snap_id}")
+        changes = self.diff(snap_id, undo_id)
+
+        for rel in changes["added"]:
+            os.remove(os.path.join(self.wd_real, rel))
+        for rel in changes["removed"] + changes["modified"]:
+            dest = os.path.join(self.wd_real, rel)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            with open(self._object_path(target[rel]), "rb") as src, open(dest, "wb") as out:
+                out.write(src.read())
+
+        self._needs_walk = True
+        return undo_id, changes
+
+
+def format_diff(changes):
+    """Render a diff() result as 'A path' / 'M path' / 'D path' lines."""
+    lines = [f"A {p}" for p in changes["added"]]
+    lines += [f"M {p}" for p in changes["modified"]]
+    lines += [f"D {p}" for p in changes["removed"]]
+    return "\n".join(sorted(lines, key=lambda line: line[2:]))
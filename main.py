@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import time
 from dotenv import load_dotenv
 from google import genai
@@ -11,17 +12,38 @@ from functions.get_files_info import get_files_info, schema_get_files_info
 from functions.get_file_content import get_file_content, schema_get_file_content
 from functions.write_file import write_file, schema_write_file
 from functions.run_python import run_python_file, schema_run_python_file
+from functions.metrics import Metrics
+from functions.prefetch import Prefetcher
+from functions.snapshots import SnapshotStore, format_diff
+from functions.loop_guard import LoopGuard
+from functions.router import Router, malformed_calls
+from functions.hedging import Hedger
+from functions.repo_map import build_repo_map, summarize
+
+
+# Optional features, enabled with --<flag> on the command line
+OPTION_FLAGS = {
+    "--prefetch": "prefetch",  # speculative reads after get_files_info
+    "--no-snapshots": "no_snapshots",  # skip workspace snapshots before edits
+    "--no-loop-guard": "no_loop_guard",  # don't short-circuit repeated tool calls
+    "--compact": "compact",  # structured tool results instead of prose
+    "--route": "route",  # cheaper model for simple steps (ROUTING_RULES)
+    "--hedge": "hedge",  # duplicate slow model requests, first answer wins
+    "--repo-map": "repo_map",  # prepend an ast-based map of the working directory
+}
 
 
 def parse_args():
     """
-    Returns: (prompt_string, verbose_bool)
+    Returns: (prompt_string, verbose_bool, options_dict)
     Usage:
-      uv run main.py "Your prompt here" [--verbose|-v]
+      uv run main.py "Your prompt here" [--verbose|-v] [--prefetch] [--no-snapshots] [--no-loop-guard]
+                                      [--compact] [--route] [--hedge] [--repo-map]
       uv run main.py Your prompt here --verbose
     """
     raw = sys.argv[1:]
     verbose = False
+    options = {name: False for name in OPTION_FLAGS.values()}
 
     if '--verbose' in raw:
         verbose = True
@@ -29,40 +51,58 @@ def parse_args():
     if '-v' in raw:
         verbose = True
         raw = [a for a in raw if a != '-v']
+    for flag, name in OPTION_FLAGS.items():
+        if flag in raw:
+            options[name] = True
+            raw = [a for a in raw if a != flag]
 
     if not raw:
         print('Error: No prompt provided.\nUsage: uv run main.py "<your prompt>" [--verbose]')
         sys.exit(1)
 
     prompt = " ".join(raw)
-    return prompt, verbose
+    return prompt, verbose, options
 
 
 # --- Helpers added in Ch 4.1 fixes ---
 
-def _normalize_relative_path(p: str) -> str:
+def _normalize_relative_path(p: str, working_directory: str = "calculator") -> str:
     """
     Make a path safe & relative:
     - strip leading slashes
-    - strip leading 'calculator/' (since we inject working_directory='calculator')
+    - strip a leading '<working dir name>/' (e.g. 'calculator/', since we inject working_directory)
     """
     if not isinstance(p, str):
         return p
     while p.startswith("/"):
         p = p[1:]
-    if p.startswith("calculator/"):
-        p = p[len("calculator/"):]
+    prefix = os.path.basename(os.path.normpath(working_directory)) + "/"
+    if p.startswith(prefix):
+        p = p[len(prefix):]
     return p
 
 
-def call_model_with_retries(client, model, messages, config, *, retries=3, base_delay=1.0, verbose=False):
+def call_model_with_retries(client, model, messages, config, *, retries=3, base_delay=1.0, verbose=False,
+                            emit=print, hedger=None):
     """
     Call client.models.generate_content with simple exponential backoff
     for transient errors like 503/UNAVAILABLE or 429/rate limit.
+
+    With a Hedger, each attempt goes through client.aio and a duplicate
+    request is sent if it is slower than recent calls to the same model.
     """
     attempt = 0
     while True:
         try:
+            if hedger is not None:
+                return hedger.call(
+                    lambda: client.aio.models.generate_content(
+                        model=model,
+                        contents=messages,
+                        config=config,
+                    ),
+                    key=model,
+                )
             return client.models.generate_content(
                 model=model,
                 contents=messages,
@@ -75,7 +115,7 @@ def call_model_with_retries(client, model, messages, config, *, retries=3, base_
                 raise
             delay = base_delay * (2 ** (attempt - 1))
             if verbose:
-                print(f"(retry {attempt}/{retries}) transient server error {getattr(e, 'status_code', '?')}, waiting {delay:.1f}s…")
+                emit(f"(retry {attempt}/{retries}) transient server error {getattr(e, 'status_code', '?')}, waiting {delay:.1f}s…")
             time.sleep(delay)
         except genai_errors.APIError as e:
             status = getattr(e, "status", "")
@@ -86,35 +126,52 @@ def call_model_with_retries(client, model, messages, config, *, retries=3, base_
                     raise
                 delay = base_delay * (2 ** (attempt - 1))
                 if verbose:
-                    print(f"(retry {attempt}/{retries}) API error {status or code}, waiting {delay:.1f}s…")
+                    emit(f"(retry {attempt}/{retries}) API error {status or code}, waiting {delay:.1f}s…")
                 time.sleep(delay)
             else:
                 raise
 
 
-def call_function(function_call_part, verbose=False):
+def call_function(function_call_part, verbose=False, prefetcher=None, snapshots=None, metrics=None,
+                  working_directory="calculator", emit=print, loop_guard=None, compact=False):
     """
     Execute one of our declared functions based on LLM's request.
 
+    If a Prefetcher is given, directory listings schedule background reads
+    and get_file_content is answered from memory when possible.
+    If a SnapshotStore is given, the workspace is snapshotted before
+    write_file / run_python_file so the change can be rolled back.
+    If Metrics is given, run_python_file records its resource usage there.
+    If a LoopGuard is given, a call repeated with an unchanged workspace is
+    answered from the previous result instead of running the tool again.
+    With compact=True, get_files_info / run_python_file return structured
+    dicts, which become the function_response itself.
+
     Returns a types.Content with a tool function_response part:
-      { "result": "<string result or error>" }
+      { "result": "<string result or error>" }  or, in compact mode, the result dict
     """
     name = function_call_part.name
     args = dict(function_call_part.args or {})
 
     # Normalize common path args so "pkg/render.py" and "calculator/pkg/render.py" both work
     if "file_path" in args and isinstance(args["file_path"], str):
-        args["file_path"] = _normalize_relative_path(args["file_path"])
+        args["file_path"] = _normalize_relative_path(args["file_path"], working_directory)
     if "directory" in args and isinstance(args["directory"], str):
-        args["directory"] = _normalize_relative_path(args["directory"])
+        args["directory"] = _normalize_relative_path(args["directory"], working_directory)
 
     if verbose:
-        print(f"Calling function: {name}({args})")
+        emit(f"Calling function: {name}({args})")
     else:
-        print(f" - Calling function: {name}")
+        emit(f" - Calling function: {name}")
 
     # Security: the LLM can't control the working directory
-    args["working_directory"] = "calculator"
+    args["working_directory"] = working_directory
+    args.pop("metrics", None)
+    args.pop("compact", None)
+    if name == "run_python_file":
+        args["metrics"] = metrics
+    if compact and name in ("get_files_info", "run_python_file"):
+        args["compact"] = True
 
     function_map = {
         "get_files_info": get_files_info,
@@ -135,38 +192,59 @@ def call_function(function_call_part, verbose=False):
             ],
         )
 
-    try:
-        result = func(**args)
-    except Exception as e:
-        result = f"Error while executing {name}: {e}"
+    # A repeat of an earlier call with no workspace changes gets the old result back
+    guard_key, result = (None, None)
+    if loop_guard is not None:
+        guard_key, result = loop_guard.check(name, args)
+        if result is not None:
+            emit("   (repeated call, returning previous result)")
+            guard_key = None
+    repeated = result is not None
+
+    if result is None and prefetcher is not None and name == "get_file_content":
+        result = prefetcher.lookup(args["working_directory"], args.get("file_path", ""))
+
+    if not repeated and snapshots is not None and name in ("write_file", "run_python_file"):
+        target = args.get("file_path", "")
+        # write_file only touches its target; a script may change anything
+        paths = [target] if name == "write_file" else None
+        snap_id = snapshots.snapshot(f"before {name} {target}", paths=paths)
+        if verbose:
+            emit(f"(snapshot {snap_id} taken before {name})")
+
+    if result is None:
+        try:
+            result = func(**args)
+        except Exception as e:
+            result = f"Error while executing {name}: {e}"
+
+    if loop_guard is not None:
+        loop_guard.record(guard_key, result)
+
+    failed = isinstance(result, str) and result.startswith("Error")
+    if not repeated and prefetcher is not None and not failed:
+        if name == "get_files_info":
+            prefetcher.schedule(args["working_directory"], args.get("directory", "."))
+        elif name == "write_file":
+            prefetcher.invalidate(args["working_directory"], args.get("file_path", ""))
+
+    response = result if isinstance(result, dict) else {"result": result}
+    if metrics is not None:
+        # What this result adds to every later prompt (compare with/without --compact)
+        metrics.incr("tool.response_chars", len(json.dumps(response, ensure_ascii=False)))
 
     return types.Content(
         role="tool",
         parts=[
             types.Part.from_function_response(
                 name=name,
-                response={"result": result},
+                response=response,
             )
         ],
     )
 
 
-def main():
-    # 0) args & key
-    user_prompt, verbose = parse_args()
-    if verbose:
-        print(f"User prompt: {user_prompt}\n")
-
-    load_dotenv()
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        print("Error: GEMINI_API_KEY not found in environment (.env).")
-        sys.exit(1)
-
-    client = genai.Client(api_key=api_key)
-
-    # 1) system prompt (tools + loop behavior)
-    system_prompt = """
+SYSTEM_PROMPT = """
 You are a helpful AI coding agent.
 
 You may plan and call tools repeatedly until the task is complete.
@@ -181,47 +259,128 @@ Rules (very important):
 - Prefer minimal edits to fix the bug in-place.
 - Use paths RELATIVE to the working directory only (do NOT prefix with "calculator/").
 - After any code change, verify by running the project’s Python files (e.g., `main.py`, `tests.py`) and report results.
+- When asked to make code faster, run it with profile=true and optimize the functions that dominate the profile.
 - If the user asks to “fix a bug”, you must: (1) locate the cause, (2) edit the affected file(s), (3) re-run to confirm the fix, (4) summarize what changed.
 
 Stop calling tools and produce a final answer when finished and verified.
 """
 
-    # 2) initial conversation messages
-    messages = [
-        types.Content(role="user", parts=[types.Part(text=user_prompt)]),
-    ]
+MAX_STEPS = 20
 
-    # 3) register all tools
-    available_functions = types.Tool(
-        function_declarations=[
-            schema_get_files_info,
-            schema_get_file_content,
-            schema_write_file,
-            schema_run_python_file,
-        ]
-    )
+TOOL_DECLARATIONS = [
+    schema_get_files_info,
+    schema_get_file_content,
+    schema_write_file,
+    schema_run_python_file,
+]
 
-    config = types.GenerateContentConfig(
+
+def build_config(repo_map=None):
+    """
+    GenerateContentConfig with all tools registered and the system prompt.
+    If repo_map (summary text) is given it is prepended to the system prompt.
+    """
+    available_functions = types.Tool(function_declarations=TOOL_DECLARATIONS)
+    system_prompt = SYSTEM_PROMPT
+    if repo_map:
+        system_prompt = (
+            "Repository map of the working directory (files, classes, functions, line numbers). "
+            "Use it to go straight to the relevant file instead of listing directories:\n"
+            f"{repo_map}\n{SYSTEM_PROMPT}"
+        )
+    return types.GenerateContentConfig(
         tools=[available_functions],
         system_instruction=system_prompt,
     )
 
-    # 4) agent loop
-    MAX_STEPS = 20
+
+def run_agent(client, user_prompt, *, working_directory="calculator", options=None, verbose=False,
+              metrics=None, prefetcher=None, emit=print, cancel=None, hedger=None):
+    """
+    Run one agent session: loop model -> tool calls until a final answer or MAX_STEPS.
+
+    working_directory: sandbox the tools operate in
+    options:           dict from parse_args() (missing keys mean "off")
+    prefetcher:        optional shared Prefetcher (created here if options["prefetch"])
+    hedger:            optional shared Hedger (created here if options["hedge"])
+    emit:              called with each line of output (print for the CLI)
+    cancel:            optional threading.Event; checked before each model/tool call
+
+    Returns the final response text, or None if stopped/cancelled.
+    """
+    options = options or {}
+    metrics = metrics if metrics is not None else Metrics()
+    if prefetcher is None and options.get("prefetch"):
+        prefetcher = Prefetcher(metrics=metrics)
+    if hedger is None and options.get("hedge"):
+        hedger = Hedger(metrics=metrics)
+    snapshots = None
+    if not options.get("no_snapshots"):
+        snapshots = SnapshotStore(working_directory, metrics=metrics)
+        session_start = snapshots.snapshot("session start")
+    loop_guard = None if options.get("no_loop_guard") else LoopGuard(metrics=metrics)
+    # Without --route every step uses MODEL_DEFAULT, but cost/latency are still tracked
+    router = Router(metrics=metrics) if options.get("route") else Router(rules=[], metrics=metrics)
+
+    # 1) config: system prompt (tools + loop behavior), optional repo map, and all tools
+    repo_map = None
+    if options.get("repo_map"):
+        repo_map = summarize(build_repo_map(working_directory, metrics=metrics))
+    config = build_config(repo_map)
+
+    # 2) initial conversation messages
+    messages = [
+        types.Content(role="user", parts=[types.Part(text=user_prompt)]),
+    ]
+
+    # 3) agent loop
+    final_text = None
+    response = None
+    first_edit_step = None
     for step in range(1, MAX_STEPS + 1):
+        if cancel is not None and cancel.is_set():
+            emit("Cancelled.")
+            break
         if verbose:
-            print(f"\n--- Iteration {step} ---")
+            emit(f"\n--- Iteration {step} ---")
+
+        model, rule = router.choose(step, messages)
+        if verbose and options.get("route"):
+            emit(f"(model: {model}, rule: {rule})")
 
         # Ask the model "what's next?" with full conversation (with retries)
-        response = call_model_with_retries(
-            client,
-            "gemini-2.0-flash-001",
-            messages,
-            config,
-            retries=3,
-            base_delay=1.0,
-            verbose=verbose,
+        started = time.perf_counter()
+        try:
+            response = call_model_with_retries(
+                client,
+                model,
+                messages,
+                config,
+                retries=3,
+                base_delay=1.0,
+                verbose=verbose,
+                emit=emit,
+                hedger=hedger,
+            )
+        except Exception:
+            router.observe(step, model, time.perf_counter() - started, error=True)
+            raise
+
+        # Malformed = unknown tool / missing args, or neither calls nor text
+        function_calls = getattr(response, "function_calls", None)
+        problems = malformed_calls(function_calls, TOOL_DECLARATIONS)
+        if not function_calls and not getattr(response, "text", None):
+            problems.append("empty response")
+        router.observe(
+            step,
+            model,
+            time.perf_counter() - started,
+            response=response,
+            tool_names=[fc.name for fc in function_calls or []],
+            malformed=problems,
         )
+        if problems and verbose:
+            emit(f"(malformed response from {model}: {'; '.join(problems)})")
 
         # Always append the model's content (includes any function-call plan)
         candidates = getattr(response, "candidates", []) or []
@@ -230,10 +389,21 @@ Stop calling tools and produce a final answer when finished and verified.
                 messages.append(cand.content)
 
         # Did the model ask to call any tools?
-        function_calls = getattr(response, "function_calls", None)
         if function_calls:
             for fc in function_calls:
-                tool_reply = call_function(fc, verbose=verbose)
+                if cancel is not None and cancel.is_set():
+                    break
+                tool_reply = call_function(
+                    fc,
+                    verbose=verbose,
+                    prefetcher=prefetcher,
+                    snapshots=snapshots,
+                    metrics=metrics,
+                    working_directory=working_directory,
+                    emit=emit,
+                    loop_guard=loop_guard,
+                    compact=options.get("compact", False),
+                )
 
                 # Sanity check + add tool response to conversation
                 parts = getattr(tool_reply, "parts", [])
@@ -242,30 +412,96 @@ Stop calling tools and produce a final answer when finished and verified.
 
                 messages.append(tool_reply)
 
+                if first_edit_step is None and fc.name == "write_file":
+                    result = parts[0].function_response.response.get("result", "")
+                    if isinstance(result, str) and result.startswith("Successfully"):
+                        first_edit_step = step
+
                 if verbose:
                     resp_dict = parts[0].function_response.response
-                    print(f"-> {resp_dict}")
+                    emit(f"-> {resp_dict}")
+
+            # Stuck repeating the same call: stop now instead of burning the remaining steps
+            if loop_guard is not None and loop_guard.tripped:
+                emit(loop_guard.tripped)
+                # An upper bound on what the stop avoided: the session might have
+                # recovered or finished before MAX_STEPS on its own.
+                remaining = MAX_STEPS - step
+                metrics.incr("loop.guard_stops")
+                metrics.incr("loop.steps_remaining_at_stop", remaining)
+                prompt_tokens = getattr(getattr(response, "usage_metadata", None), "prompt_token_count", None)
+                if prompt_tokens:
+                    metrics.observe("loop.prompt_tokens_at_stop", prompt_tokens)
+                break
 
             # Next iteration: the model will see tool outputs and continue
             continue
 
         # If no tool calls, check for final text
         if getattr(response, "text", None):
-            print("Final response:")
-            print(response.text)
+            final_text = response.text
+            emit("Final response:")
+            emit(final_text)
             break
     else:
-        print("Stopped: reached maximum number of steps without a final response.")
+        emit("Stopped: reached maximum number of steps without a final response.")
+
+    # How quickly the agent got to work (compare sessions with/without --repo-map)
+    map_state = "on" if repo_map else "off"
+    if first_edit_step is not None:
+        metrics.observe(f"repo_map.{map_state}.iterations_to_first_edit", first_edit_step)
+
+    # Files changed this session (by content hash), with the snapshot to roll back to
+    if snapshots is not None:
+        changes = format_diff(snapshots.diff(session_start))
+        if changes:
+            emit("\n=== Changed files ===")
+            emit(changes)
+            emit(f"(undo with: uv run workspace.py rollback {session_start} --dir {working_directory})")
 
     # Optional token usage
     usage = getattr(response, "usage_metadata", None)
     if verbose:
-        print("\n=== Token Usage ===")
+        emit("\n=== Token Usage ===")
         if usage:
-            print(f"Prompt tokens: {usage.prompt_token_count}")
-            print(f"Response tokens: {usage.candidates_token_count}")
+            emit(f"Prompt tokens: {usage.prompt_token_count}")
+            emit(f"Response tokens: {usage.candidates_token_count}")
         else:
-            print("No usage metadata returned by the model.")
+            emit("No usage metadata returned by the model.")
+
+        if prefetcher is not None:
+            rate = prefetcher.hit_rate()
+            emit("\n=== Prefetch ===")
+            emit(f"Hit rate: {rate:.0%}" if rate is not None else "Hit rate: n/a (no file reads)")
+
+        routes = router.report()
+        if routes:
+            emit("\n=== Model routes ===")
+            emit(routes)
+
+        report = metrics.report()
+        if report:
+            emit("\n=== Metrics ===")
+            emit(report)
+
+    return final_text
+
+
+def main():
+    # 0) args & key
+    user_prompt, verbose, options = parse_args()
+    if verbose:
+        print(f"User prompt: {user_prompt}\n")
+
+    load_dotenv()
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        print("Error: GEMINI_API_KEY not found in environment (.env).")
+        sys.exit(1)
+
+    client = genai.Client(api_key=api_key)
+
+    run_agent(client, user_prompt, options=options, verbose=verbose)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,144 @@
+# test_daemon.py (project root) — run with: uv run python -m unittest test_daemon
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from daemon import QueueFull, SessionManager, WorkspaceBusy
+from functions.snapshots import SnapshotStore
+
+TEMPLATE = os.path.abspath("calculator")
+
+
+class FakeModels:
+    """Stands in for client.models: answers with plain text once `release` is set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate_content(self, model, contents, config):
+        self.release.wait(5)
+        return SimpleNamespace(candidates=[], function_calls=None, text="done", usage_metadata=None)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        # Snapshots and repo map caches are written relative to the cwd
+        self.old_cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+        self.models = FakeModels()
+        self.manager = SessionManager(
+            SimpleNamespace(models=self.models),
+            max_concurrent=1,
+            max_queue=1,
+            workspace_root="workspaces",
+            template=TEMPLATE,
+        )
+        os.makedirs(os.path.join("workspaces", "shared", "pkg"))
+
+    def tearDown(self):
+        self.models.release.set()
+        self.manager._pool.shutdown(wait=True)
+        os.chdir(self.old_cwd)
+        shutil.rmtree(self.tmp)
+
+    def start_blocked(self, working_directory=None):
+        """Submit a session and wait until it is running (and stuck in the model call)."""
+        self.models.release.clear()
+        session = self.manager.submit("p", working_directory=working_directory)
+        self.assertTrue(wait_for(lambda: session.state == "running"))
+        return session
+
+    def test_rejects_paths_outside_the_workspace_root(self):
+        for path in ("../outside", "/etc", "shared/../..", os.path.abspath(self.tmp)):
+            with self.assertRaises(ValueError, msg=path):
+                self.manager.submit("p", working_directory=path)
+        self.assertEqual(self.manager.sessions, {})
+
+    def test_rejects_the_workspace_root_itself(self):
+        for path in (".", "./", "shared/.."):
+            with self.assertRaises(ValueError, msg=path):
+                self.manager.submit("p", working_directory=path)
+
+    def test_rejects_non_string_working_directory(self):
+        for value in (3, ["shared"], {"dir": "shared"}):
+            with self.assertRaises(ValueError):
+                self.manager.submit("p", working_directory=value)
+
+    def test_rejects_nested_workspace_in_use(self):
+        self.start_blocked("shared")
+        for path in ("shared", "shared/pkg", "shared/pkg/.."):
+            with self.assertRaises(WorkspaceBusy, msg=path):
+                self.manager.submit("p", working_directory=path)
+
+    def test_rejects_parent_of_workspace_in_use(self):
+        self.start_blocked("shared/pkg")
+        with self.assertRaises(WorkspaceBusy):
+            self.manager.submit("p", working_directory="shared")
+
+    def test_queue_full(self):
+        self.start_blocked()
+        queued = self.manager.submit("p")
+        self.assertEqual(queued.state, "queued")
+        with self.assertRaises(QueueFull):
+            self.manager.submit("p")
+        self.assertEqual(self.manager.metrics.get("daemon.rejected"), 1)
+
+    def test_auto_workspace_is_a_template_copy(self):
+        session = self.manager.submit("p")
+        self.assertTrue(wait_for(session.is_finished))
+        self.assertEqual(os.path.basename(session.working_directory), "calculator")
+        self.assertTrue(os.path.isfile(os.path.join(session.working_directory, "main.py")))
+
+    def test_prune_deletes_only_auto_workspaces(self):
+        auto = self.manager.submit("p")
+        self.assertTrue(wait_for(auto.is_finished))
+        named = self.manager.submit("p", working_directory="shared")
+        self.assertTrue(wait_for(named.is_finished))
+        auto_snapshots = SnapshotStore(auto.working_directory).root
+        named_snapshots = SnapshotStore(named.working_directory).root
+        self.assertTrue(os.path.isdir(auto_snapshots))
+
+        self.assertEqual(self.manager.prune(now=time.time() + self.manager.session_ttl + 1), 2)
+        self.assertEqual(self.manager.sessions, {})
+        self.assertFalse(os.path.exists(os.path.dirname(auto.working_directory)))
+        self.assertFalse(os.path.exists(auto_snapshots))
+        self.assertTrue(os.path.isdir(os.path.join("workspaces", "shared", "pkg")))
+        self.assertTrue(os.path.isdir(named_snapshots))
+
+    def test_prune_keeps_at_most_max_finished(self):
+        self.manager.max_finished = 1
+        first = self.manager.submit("p")
+        self.assertTrue(wait_for(first.is_finished))
+        time.sleep(0.01)
+        second = self.manager.submit("p")
+        self.assertTrue(wait_for(second.is_finished))
+
+        self.manager.prune()
+        self.assertEqual(list(self.manager.sessions), [second.id])
+        self.assertFalse(os.path.exists(first.working_directory))
+        self.assertTrue(os.path.exists(second.working_directory))
+
+    def test_failed_copy_releases_the_session(self):
+        self.manager.template = os.path.join(self.tmp, "missing")
+        with self.assertRaises(OSError):
+            self.manager.submit("p")
+        self.assertEqual(self.manager.sessions, {})
+        self.assertEqual(os.listdir("workspaces"), ["shared"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# test_hedging.py (project root) — run with: uv run python -m unittest test_hedging
+
+import asyncio
+import unittest
+
+from functions.hedging import Hedger
+from functions.metrics import Metrics
+
+
+class FakeCalls:
+    """make_coro for Hedger.call: attempt i sleeps delays[i] seconds (or raises if it's an exception)."""
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.started = 0
+        self.cancelled = []
+
+    def __call__(self):
+        attempt = self.started
+        self.started += 1
+        return self._run(attempt)
+
+    async def _run(self, attempt):
+        delay = self.delays[attempt]
+        if isinstance(delay, Exception):
+            raise delay
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(attempt)
+            raise
+        return attempt
+
+
+class TestHedger(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.hedger = Hedger(metrics=self.metrics, min_samples=3, initial_delay=0.05, max_rate=1.0)
+
+    def samples(self, key="m"):
+        return list(self.hedger._latencies.get(key, ()))
+
+    def test_fast_call_is_not_hedged(self):
+        calls = FakeCalls(0.01)
+        self.assertEqual(self.hedger.call(calls, key="m"), 0)
+        self.assertEqual(calls.started, 1)
+        self.assertEqual(self.metrics.get("hedge.fired"), 0)
+        self.assertEqual(len(self.samples()), 1)
+
+    def test_slow_primary_is_hedged_and_cancelled(self):
+        calls = FakeCalls(1.0, 0.01)
+        self.assertEqual(self.hedger.call(calls, key="m"), 1)
+        self.assertEqual(self.metrics.get("hedge.fired"), 1)
+        self.assertEqual(self.metrics.get("hedge.won"), 1)
+        self._wait_for(lambda: calls.cancelled == [0])
+
+        # One sample for the call: the primary's elapsed time, not the fast hedge
+        samples = self.samples()
+        self.assertEqual(len(samples), 1)
+        self.assertGreaterEqual(samples[0], 0.05)
+
+    def test_latency_saved_uses_history_slower_than_elapsed(self):
+        # Median threshold of 0.02 s; the calls known to run long took 0.6 s
+        self.hedger.percentile = 0.5
+        for seconds in [0.02] * 6 + [0.6] * 4:
+            self.hedger._record("m", seconds)
+        self.hedger.call(FakeCalls(1.0, 0.01), key="m")
+        saved = self.metrics.get("hedge.latency_saved_est")
+        self.assertGreater(saved, 0.45)
+        self.assertLess(saved, 0.6)
+
+    def test_latency_saved_is_zero_without_slower_history(self):
+        self.hedger.call(FakeCalls(1.0, 0.01), key="m")
+        self.assertEqual(self.metrics.get("hedge.won"), 1)
+        self.assertEqual(self.metrics.get("hedge.latency_saved_est"), 0)
+
+    def test_budget_limits_hedges(self):
+        self.hedger.max_rate = 0.0  # still allows one hedge
+        self.hedger.call(FakeCalls(0.2, 0.01), key="m")
+        calls = FakeCalls(0.2, 0.01)
+        self.assertEqual(self.hedger.call(calls, key="m"), 0)
+        self.assertEqual(calls.started, 1)
+        self.assertEqual(self.metrics.get("hedge.fired"), 1)
+
+    def test_error_propagates_when_every_attempt_fails(self):
+        with self.assertRaises(ValueError):
+            self.hedger.call(FakeCalls(ValueError("boom")), key="m")
+
+    def test_failed_primary_falls_back_to_hedge(self):
+        async def fail_late():
+            await asyncio.sleep(0.1)
+            raise ValueError("primary")
+
+        attempts = iter([fail_late, lambda: FakeCalls(0.01)._run(0)])
+        self.assertEqual(self.hedger.call(lambda: next(attempts)(), key="m"), 0)
+        self.assertEqual(self.metrics.get("hedge.won"), 1)
+        self.assertEqual(self.metrics.get("hedge.latency_saved_est"), 0)
+
+    def _wait_for(self, predicate, timeout=1.0):
+        future = asyncio.run_coroutine_threadsafe(self._poll(predicate, timeout), self.hedger._loop)
+        self.assertTrue(future.result())
+
+    @staticmethod
+    async def _poll(predicate, timeout):
+        for _ in range(int(timeout / 0.01)):
+            if predicate():
+                return True
+            await asyncio.sleep(0.01)
+        return predicate()
+
+
+if __name__ == "__main__":
+    unittest.main()
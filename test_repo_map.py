@@ -0,0 +1,54 @@
+# test_repo_map.py (project root) — run with: uv run python -m unittest test_repo_map
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from functions.metrics import Metrics
+from functions.repo_map import build_repo_map, summarize
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+class TestRepoMap(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.wd = os.path.join(self.tmp, "ws")
+        os.makedirs(self.wd)
+        write(os.path.join(self.wd, "net.py"), (
+            "async def fetch(url, *, timeout=3):\n"
+            "    pass\n"
+            "\n"
+            "def parse(text):\n"
+            "    pass\n"
+            "\n"
+            "class Client:\n"
+            "    async def get(self, path):\n"
+            "        pass\n"
+        ))
+        self.cache_file = os.path.join(self.tmp, "repo_map.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_summary_renders_async_functions(self):
+        text = summarize(build_repo_map(self.wd, cache_file=self.cache_file))
+        self.assertIn("  async def fetch(url, *, timeout=3)  L1", text)
+        self.assertIn("  def parse(text)  L4", text)
+        self.assertIn("    async get(self, path)  L8", text)
+        self.assertNotIn("def async", text)
+
+    def test_unchanged_files_come_from_the_cache(self):
+        build_repo_map(self.wd, cache_file=self.cache_file)
+        metrics = Metrics()
+        build_repo_map(self.wd, cache_file=self.cache_file, metrics=metrics)
+        self.assertEqual(metrics.get("repo_map.files_parsed"), 0)
+        self.assertEqual(metrics.get("repo_map.files_reused"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
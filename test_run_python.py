@@ -0,0 +1,82 @@
+# test_run_python.py (project root) — run with: uv run python -m unittest test_run_python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from functions.run_python import run_python_file
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "peak RSS is read from /proc")
+class TestRunPythonUsage(unittest.TestCase):
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+        write(os.path.join(self.wd, "small.py"), "print('ok')\n")
+        write(os.path.join(self.wd, "big.py"), (
+            "x = bytearray(150 * 1024 * 1024)\n"
+            "for i in range(0, len(x), 4096):\n"
+            "    x[i] = 1\n"
+        ))
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def test_peak_rss_is_the_scripts_not_the_parents(self):
+        ballast = bytearray(300 * 1024 * 1024)
+        for i in range(0, len(ballast), 4096):
+            ballast[i] = 1
+
+        result = run_python_file(self.wd, "small.py", compact=True)
+        self.assertEqual(result["stdout"], "ok")
+        self.assertLess(result["rss_mb"], 100)
+        del ballast
+
+    def test_peak_rss_counts_the_scripts_own_allocations(self):
+        result = run_python_file(self.wd, "big.py", compact=True)
+        self.assertGreater(result["rss_mb"], 150)
+
+
+class TestRunPythonProfile(unittest.TestCase):
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+        # Same name as the stdlib module cProfile imports
+        write(os.path.join(self.wd, "profile.py"), (
+            "def work():\n"
+            "    return sum(i * i for i in range(100000))\n"
+        ))
+        write(os.path.join(self.wd, "main.py"), (
+            "import sys\n"
+            "import profile\n"
+            "print(profile.work())\n"
+            "sys.exit(int(sys.argv[1]) if len(sys.argv) > 1 else 0)\n"
+        ))
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def test_exit_status_is_kept(self):
+        result = run_python_file(self.wd, "main.py", ["3"], profile=True, compact=True)
+        self.assertEqual(result["exit_code"], 3)
+        self.assertIn("profile", result)
+
+    def test_workspace_module_does_not_shadow_the_profiler(self):
+        result = run_python_file(self.wd, "main.py", profile=True, compact=True)
+        self.assertEqual(result["exit_code"], 0)
+        self.assertEqual(result["stdout"], str(sum(i * i for i in range(100000))))
+
+    def test_workspace_file_named_like_stdlib_is_not_filtered(self):
+        result = run_python_file(self.wd, "main.py", profile=True, compact=True)
+        labels = [row[0] for row in result["profile"]["cumulative"]]
+        self.assertIn("profile.py:1(work)", labels)
+        self.assertFalse(any(label.startswith("<frozen importlib") for label in labels))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# test_snapshots.py (project root) — run with: uv run python -m unittest test_snapshots
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from functions.metrics import Metrics
+from functions.snapshots import SnapshotStore
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+class TestSnapshotStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.wd = os.path.join(self.tmp, "ws")
+        os.makedirs(os.path.join(self.wd, "pkg"))
+        write(os.path.join(self.wd, "a.txt"), "a original")
+        write(os.path.join(self.wd, "b.txt"), "b original")
+        write(os.path.join(self.wd, "pkg", "c.py"), "c = 1\n")
+        self.root = os.path.join(self.tmp, "store")
+        self.store = SnapshotStore(self.wd, root=self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_consecutive_write_snapshots_keep_earlier_edit(self):
+        s0 = self.store.snapshot("start")
+        self.store.snapshot("before write a", paths=["a.txt"])
+        write(os.path.join(self.wd, "a.txt"), "a edited")
+        s2 = self.store.snapshot("before write b", paths=["b.txt"])
+        write(os.path.join(self.wd, "b.txt"), "b edited")
+
+        self.assertEqual(self.store.diff(s0, s2)["modified"], ["a.txt"])
+
+        self.store.rollback(s2)
+        self.assertEqual(read(os.path.join(self.wd, "a.txt")), "a edited")
+        self.assertEqual(read(os.path.join(self.wd, "b.txt")), "b original")
+
+    def test_new_store_reuses_saved_index(self):
+        self.store.snapshot("start")
+        write(os.path.join(self.wd, "b.txt"), "b edited")
+
+        metrics = Metrics()
+        store = SnapshotStore(self.wd, root=self.root, metrics=metrics)
+        store.snapshot("next session")
+        # only the changed file is hashed again
+        self.assertEqual(metrics.get("snapshot.files_hashed"), 1)
+
+    def test_rollback_restores_added_removed_and_modified(self):
+        s0 = self.store.snapshot("start")
+        self.store.snapshot("before run")
+        write(os.path.join(self.wd, "pkg", "c.py"), "c = 2\n")
+        write(os.path.join(self.wd, "new.py"), "x = 1\n")
+        os.remove(os.path.join(self.wd, "a.txt"))
+
+        changes = self.store.diff(s0)
+        self.assertEqual(changes["added"], ["new.py"])
+        self.assertEqual(changes["removed"], ["a.txt"])
+        self.assertEqual(changes["modified"], [os.path.join("pkg", "c.py")])
+
+        undo_id, _ = self.store.rollback(s0)
+        self.assertEqual(self.store.diff(s0), {"added": [], "removed": [], "modified": []})
+        self.assertTrue(os.path.exists(os.path.join(self.wd, "a.txt")))
+        self.assertFalse(os.path.exists(os.path.join(self.wd, "new.py")))
+
+        # ...and the rollback itself can be undone
+        self.store.rollback(undo_id)
+        self.assertEqual(read(os.path.join(self.wd, "pkg", "c.py")), "c = 2\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
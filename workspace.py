@@ -0,0 +1,64 @@
+# workspace.py (project root) — inspect / undo agent edits in the working directory
+import sys
+import time
+
+from functions.snapshots import SnapshotStore, format_diff
+
+WORKING_DIRECTORY = "calculator"
+
+USAGE = """Usage:
+  uv run workspace.py list                  show snapshots (oldest first)
+  uv run workspace.py diff <id> [<id2>]     files changed since snapshot <id> (or between two)
+  uv run workspace.py rollback <id>         restore the working directory to snapshot <id>
+
+  Add --dir <path> to use another working directory (default: calculator)."""
+
+
+def main():
+    argv = sys.argv[1:]
+    working_directory = WORKING_DIRECTORY
+    if "--dir" in argv:
+        i = argv.index("--dir")
+        if i + 1 >= len(argv):
+            print(USAGE)
+            sys.exit(1)
+        working_directory = argv[i + 1]
+        argv = argv[:i] + argv[i + 2:]
+
+    if not argv or argv[0] not in ("list", "diff", "rollback"):
+        print(USAGE)
+        sys.exit(1)
+
+    store = SnapshotStore(working_directory)
+    command, rest = argv[0], argv[1:]
+
+    try:
+        if command == "list":
+            for snap_id, label, created, count in store.list_snapshots():
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+                print(f"{snap_id:>4}  {stamp}  {count:>4} files  {label}")
+            return
+
+        if not rest:
+            print(USAGE)
+            sys.exit(1)
+
+        if command == "diff":
+            other = int(rest[1]) if len(rest) > 1 else None
+            print(format_diff(store.diff(int(rest[0]), other)) or "No changes.")
+            return
+
+        undo_id, changes = store.rollback(int(rest[0]))
+        print(format_diff(changes) or "No changes.")
+        print(f"Rolled back to snapshot {rest[0]} (undo with: uv run workspace.py rollback {undo_id} --dir {working_directory})")
+
+    except FileNotFoundError:
+        print(f"Error: unknown snapshot {rest[0]}")
+        sys.exit(1)
+    except ValueError:
+        print(f"Error: snapshot ids must be integers: {' '.join(rest)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()